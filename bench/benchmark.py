@@ -0,0 +1,428 @@
+#!/usr/bin/env python
+"""Headless benchmarks for Schemr's scheme discovery, parsing and listing.
+
+Generates synthetic corpora of ``.tmTheme`` and ``.sublime-color-scheme``
+files (some of them zipped into ``.sublime-package`` archives), loads ``schemr.py`` against a stub of the
+``sublime`` module that serves resources from the corpus, and reports the
+latency, allocations (tracemalloc) and peak RSS of each stage.
+
+Usage:
+
+	python bench/benchmark.py [--sizes 100,1000,5000] [--processes 2,4,8] [--st2] [--keep DIR]
+
+``--processes`` adds a cold ``build_catalog`` stage for each number of
+worker processes (see ``schemr_index_processes``). The speedup over the
+threaded cold stage is bounded by the number of cores of the machine.
+
+Run it with Python 3.4 or later. Results are printed to stdout, e.g. to be
+redirected to ``bench_output.txt``.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+import zipfile
+
+try:
+	import resource
+except ImportError:
+	# Not available on Windows, where peak RSS isn't reported.
+	resource = None
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_PATH, 'lib'))
+
+import packages
+
+
+# ------------------------------------------------
+# Synthetic corpus
+# ------------------------------------------------
+THEME_HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
+<plist version="1.0">
+<dict>
+	<key>name</key>
+	<string>%(name)s</string>
+	<key>settings</key>
+	<array>
+		<dict>
+			<key>settings</key>
+			<dict>
+				<key>background</key>
+				<string>%(background)s</string>
+				<key>caret</key>
+				<string>%(caret)s</string>
+				<key>foreground</key>
+				<string>%(foreground)s</string>
+				<key>selection</key>
+				<string>%(selection)s</string>
+			</dict>
+		</dict>
+'''
+
+THEME_RULE = '''		<dict>
+			<key>name</key>
+			<string>Rule %(index)d</string>
+			<key>scope</key>
+			<string>%(scope)s</string>
+			<key>settings</key>
+			<dict>
+				<key>fontStyle</key>
+				<string>%(font_style)s</string>
+				<key>foreground</key>
+				<string>%(foreground)s</string>
+			</dict>
+		</dict>
+'''
+
+THEME_FOOTER = '''	</array>
+	<key>uuid</key>
+	<string>%(uuid)s</string>
+</dict>
+</plist>
+'''
+
+SCOPES = ('comment', 'string', 'keyword', 'constant.numeric', 'entity.name.function',
+	'storage.type', 'variable.parameter', 'support.function', 'invalid', 'markup.heading')
+
+
+def random_color(rng):
+	return '#%02X%02X%02X' % (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+
+
+def generate_theme(rng, name):
+	parts = [THEME_HEADER % dict(name = name, background = random_color(rng), caret = random_color(rng),
+		foreground = random_color(rng), selection = random_color(rng))]
+	# Real schemes have anywhere from a few dozen to several hundred rules.
+	for index in range(rng.randrange(40, 400)):
+		parts.append(THEME_RULE % dict(index = index, scope = rng.choice(SCOPES) + '.rule-' + str(index),
+			font_style = rng.choice(('', 'bold', 'italic')), foreground = random_color(rng)))
+	parts.append(THEME_FOOTER % dict(uuid = '%032x' % rng.getrandbits(128)))
+	return ''.join(parts).encode('utf-8')
+
+
+def generate_color_scheme(rng, name):
+	variables = dict(background = random_color(rng), foreground = random_color(rng))
+	rules = [dict(name = 'Rule %d' % index, scope = rng.choice(SCOPES) + '.rule-' + str(index),
+		font_style = rng.choice(('', 'bold', 'italic')), foreground = random_color(rng)) for index in range(rng.randrange(40, 400))]
+	scheme = dict(name = name, variables = variables, rules = rules, globals = dict(background = 'var(background)',
+		foreground = 'var(foreground)', caret = random_color(rng), selection = random_color(rng)))
+	return json.dumps(scheme, indent = 4).encode('utf-8')
+
+
+def generate_scheme(rng, name, json_ratio):
+	if rng.random() < json_ratio:
+		return name + '.sublime-color-scheme', generate_color_scheme(rng, name)
+	return name + '.tmTheme', generate_theme(rng, name)
+
+
+def generate_corpus(root, size, seed = 0, schemes_per_package = 20, zipped_ratio = 0.25, json_ratio = 0.1):
+	"""Write ``size`` schemes into ``root``/Packages and ``root``/Installed
+	Packages, ``schemes_per_package`` to a package. About ``zipped_ratio``
+	of the packages are zipped into ``.sublime-package`` archives and about
+	``json_ratio`` of the schemes are ``.sublime-color-scheme`` files.
+	"""
+	rng = random.Random(seed)
+	packages_path = os.path.join(root, 'Packages')
+	installed_packages_path = os.path.join(root, 'Installed Packages')
+	os.makedirs(os.path.join(packages_path, 'User'))
+	os.makedirs(installed_packages_path)
+
+	for package_index in range(0, (size + schemes_per_package - 1) // schemes_per_package):
+		package = 'Color Scheme %04d' % package_index
+		names = ['Scheme %05d' % index for index in range(package_index * schemes_per_package, min(size, (package_index + 1) * schemes_per_package))]
+		if rng.random() < zipped_ratio:
+			archive = zipfile.ZipFile(os.path.join(installed_packages_path, package + '.sublime-package'), 'w', zipfile.ZIP_DEFLATED)
+			try:
+				for name in names:
+					archive.writestr(*generate_scheme(rng, name, json_ratio))
+			finally:
+				archive.close()
+		else:
+			os.makedirs(os.path.join(packages_path, package))
+			for name in names:
+				filename, data = generate_scheme(rng, name, json_ratio)
+				with open(os.path.join(packages_path, package, filename), 'wb') as f:
+					f.write(data)
+
+
+# ------------------------------------------------
+# sublime / sublime_plugin stubs
+# ------------------------------------------------
+class StubSettings(object):
+	def __init__(self):
+		self.data = {}
+		self.callbacks = {}
+
+	def get(self, key, default = None):
+		return self.data.get(key, default)
+
+	def set(self, key, value):
+		self.data[key] = value
+		for callback in list(self.callbacks.values()):
+			callback()
+
+	def erase(self, key):
+		self.data.pop(key, None)
+
+	def has(self, key):
+		return key in self.data
+
+	def add_on_change(self, tag, callback):
+		self.callbacks[tag] = callback
+
+	def clear_on_change(self, tag):
+		self.callbacks.pop(tag, None)
+
+
+class StubWindow(object):
+	def show_quick_panel(self, items, on_select, flags = 0, selected_index = -1, on_highlight = None):
+		self.items = items
+		self.selected_index = selected_index
+
+
+def install_stubs(root, st2):
+	"""Install ``sublime`` and ``sublime_plugin`` modules that serve the
+	corpus in ``root``, then import and return the ``schemr`` module.
+	"""
+	# Forget the modules loaded for the previous corpus, if any.
+	for name in [name for name in sys.modules if name in ('sublime', 'sublime_plugin', 'schemr') or name.split('.')[0] == 'Schemr']:
+		del sys.modules[name]
+
+	packages_path = os.path.join(root, 'Packages')
+	installed_packages_path = os.path.join(root, 'Installed Packages')
+	settings = {}
+	resources = packages.ResourceLoader(packages_path, installed_packages_path)
+
+	sublime = types.ModuleType('sublime')
+	sublime.version = lambda: '2221' if st2 else '3211'
+	sublime.packages_path = lambda: packages_path
+	sublime.installed_packages_path = lambda: installed_packages_path
+	sublime.executable_path = lambda: os.path.join(root, 'sublime_text')
+	sublime.load_settings = lambda name: settings.setdefault(name, StubSettings())
+	sublime.save_settings = lambda name: None
+	sublime.status_message = lambda message: None
+	sublime.error_message = lambda message: None
+	# Delayed callbacks (e.g. the write-behind settings save) are left pending, as
+	# they would be in Sublime Text while a command runs.
+	sublime.set_timeout = lambda callback, delay = 0: callback() if delay <= 0 else None
+	sublime.set_timeout_async = sublime.set_timeout
+	if not st2:
+		def find_resources(pattern):
+			return packages.scan_packages(packages_path, installed_packages_path, (pattern.lstrip('*'),))
+		def load_binary_resource(resource_path):
+			with resources.open(resource_path) as f:
+				return f.read()
+		sublime.find_resources = find_resources
+		sublime.load_binary_resource = load_binary_resource
+		sublime.load_resource = lambda resource_path: load_binary_resource(resource_path).decode('utf-8')
+
+	sublime_plugin = types.ModuleType('sublime_plugin')
+	for name in ('ApplicationCommand', 'WindowCommand', 'TextCommand', 'EventListener'):
+		setattr(sublime_plugin, name, type(name, (object,), {}))
+
+	# schemr.py imports its libraries as Schemr.lib.* on ST3.
+	package = types.ModuleType('Schemr')
+	package.__path__ = [REPO_PATH]
+
+	sys.modules.update(sublime = sublime, sublime_plugin = sublime_plugin, Schemr = package)
+	sublime.load_settings('SchemrFavorites.sublime-settings').set('schemr_favorites', [])
+
+	if REPO_PATH not in sys.path:
+		sys.path.insert(0, REPO_PATH)
+	import schemr
+
+	# On ST2 the plugin indexes in the background as soon as it is imported,
+	# which would skew the measurements.
+	while schemr.Schemr.instance().indexing:
+		time.sleep(0.01)
+	return schemr
+
+
+# ------------------------------------------------
+# Measurements
+# ------------------------------------------------
+def peak_rss_kb():
+	if resource is None:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+	return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def measure(setup, run, repeat):
+	"""Time ``run`` ``repeat`` times, calling ``setup`` before each run, then
+	run it once more under tracemalloc. Returns the mean latency in
+	milliseconds and the peak traced allocations in kilobytes.
+	"""
+	elapsed = 0.0
+	for i in range(repeat):
+		setup()
+		start = time.perf_counter()
+		run()
+		elapsed += time.perf_counter() - start
+
+	setup()
+	tracemalloc.start()
+	try:
+		run()
+		peak = tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+	return elapsed * 1000 / repeat, peak / 1024.0
+
+
+def benchmark(schemr_module, size, repeat, process_counts = ()):
+	schemr = schemr_module.Schemr()
+	schemr.refresh_catalog = lambda *args: None
+	scheme_paths = [scheme_path for scheme_name, scheme_path in schemr.find_schemes()]
+	# Every tenth scheme is a favorite.
+	schemr.favorites.get('data').set('schemr_favorites', scheme_paths[::10])
+	schemr.on_favorites_change()
+	window = StubWindow()
+	nothing = lambda: None
+	package = scheme_paths[0].split('/')[1]
+	sublime = schemr_module.sublime
+	prebuilt_path = os.path.join(sublime.packages_path(), 'User', 'Schemr.index.json')
+	watcher = schemr_module.load_lib('package_watcher').PackageWatcher(sublime.packages_path(), sublime.installed_packages_path())
+
+	def reset_catalog():
+		schemr.catalog = None
+		schemr.scheme_lists = None
+
+	def reset_cache():
+		reset_catalog()
+		schemr.cache.entries = {}
+
+	def publish_catalog(processes = 0):
+		schemr.catalog = schemr.build_catalog(True, processes)
+
+	def update_package():
+		schemr.update_catalog(schemr.catalog, set([package]), True)
+
+	def watch_catalog():
+		publish_catalog()
+		watcher.watch_directories(scheme_path[len('Packages/'):].rsplit('/', 1)[0] for scheme_path in scheme_paths)
+		watcher.poll()
+
+	def use_prebuilt_index():
+		reset_cache()
+		if not os.path.exists(prebuilt_path):
+			prebuilt_index = schemr_module.load_lib('prebuilt_index')
+			prebuilt_index.write(prebuilt_index.build(sublime.packages_path(), sublime.installed_packages_path()), prebuilt_path)
+		schemr.prebuilt_path = prebuilt_path
+
+	def parse_all():
+		for scheme_path in scheme_paths:
+			schemr.parse_scheme(scheme_path)
+
+	def filter_all():
+		for scheme_path in scheme_paths:
+			schemr.filter_scheme_name(scheme_path)
+
+	def list_all():
+		schemr.list_schemes(window, schemr.load_schemes(), schemr.preferences)
+
+	def reset_scheme_lists():
+		publish_catalog()
+		schemr.scheme_lists = None
+
+	def load_views():
+		return [schemr.load_schemes(), schemr.load_favorite_schemes(), schemr.load_schemes('dark'), schemr.load_schemes('light')]
+
+	def list_views():
+		for schemes in load_views():
+			schemr.list_schemes(window, schemes, schemr.preferences)
+
+	def search(queries):
+		for i in range(1000):
+			schemr.search_schemes(queries[i % len(queries)])
+
+	def cycle(direction):
+		schemes = schemr.load_schemes()
+		for i in range(1000):
+			schemr.cycle_schemes(schemes, direction)
+
+	stages = [
+		('find_schemes', nothing, schemr.find_schemes, 1),
+		('load_schemes (no catalog)', reset_catalog, schemr.load_schemes, 1),
+		('parse_scheme (all)', nothing, parse_all, len(scheme_paths)),
+		('filter_scheme_name (all)', nothing, filter_all, len(scheme_paths)),
+		('build_catalog (cold cache)', reset_cache, publish_catalog, 1),
+	]
+	for processes in process_counts:
+		stages.append(('build_catalog (cold, %d procs)' % processes, reset_cache, lambda processes = processes: publish_catalog(processes), 1))
+	stages += [
+		('build_catalog (warm cache)', reset_catalog, publish_catalog, 1),
+		('update_catalog (1 package)', publish_catalog, update_package, 1),
+		('poll packages (no changes)', watch_catalog, watcher.poll, 1),
+		('list_schemes (display list)', publish_catalog, list_all, 1),
+		('list_schemes (4 views, cold)', reset_scheme_lists, list_views, 1),
+		('list_schemes (4 views, warm)', nothing, list_views, 1),
+		('load_schemes (dark, contrast)', publish_catalog, lambda: schemr.load_schemes('dark', 'contrast'), 1),
+		('search index (build)', publish_catalog, lambda: schemr.get_search_index(schemr.catalog, 100), 1),
+		('search_schemes (favorite change)', schemr.on_favorites_change, lambda: schemr.search_schemes('scheme 00042'), 1),
+		('search_schemes (1000 x name)', nothing, lambda: search(['scheme 00042', 'color 0012', 'dark scheme 001', 'light 01']), 1000),
+		('search_schemes (1000 x color)', nothing, lambda: search(['#1e', '#2a2a', 'dark', 'sc']), 1000),
+		('cycle_schemes (1000 x next)', publish_catalog, lambda: cycle('next'), 1000),
+		('cycle_schemes (1000 x rand)', publish_catalog, lambda: cycle('rand'), 1000),
+		# Last, since the prebuilt index would also serve the other cold stages.
+		('build_catalog (prebuilt index)', use_prebuilt_index, publish_catalog, 1),
+	]
+
+	print('')
+	print('%d schemes (%d found)' % (size, len(scheme_paths)))
+	print('plugin import: %.3f ms' % (schemr_module.load_timings['import'] * 1000))
+	print('%-30s %12s %14s %12s' % ('stage', 'total ms', 'per item us', 'peak KiB'))
+	for name, setup, run, items in stages:
+		latency, allocations = measure(setup, run, repeat)
+		per_item = '%14.2f' % (latency * 1000 / items) if items > 1 else '%14s' % '-'
+		print('%-30s %12.2f %s %12.1f' % (name, latency, per_item, allocations))
+
+	# The memory held by the scheme lists of the all/favorites/dark/light views.
+	reset_scheme_lists()
+	tracemalloc.start()
+	try:
+		views = load_views()
+		retained = tracemalloc.get_traced_memory()[0]
+	finally:
+		tracemalloc.stop()
+	print('scheme lists retained: %.1f KiB (%d schemes in 4 views)' % (retained / 1024.0, sum(len(view) for view in views)))
+
+	rss = peak_rss_kb()
+	if rss is not None:
+		print('peak RSS: %d KiB' % rss)
+
+
+def main():
+	parser = argparse.ArgumentParser(description = 'Benchmark Schemr against synthetic scheme corpora.')
+	parser.add_argument('--sizes', default = '100,1000,5000', help = 'comma-separated corpus sizes')
+	parser.add_argument('--repeat', type = int, default = 3, help = 'timed runs per stage')
+	parser.add_argument('--processes', default = '', help = 'comma-separated worker process counts for the cold index')
+	parser.add_argument('--st2', action = 'store_true', help = 'emulate Sublime Text 2 (no find_resources)')
+	parser.add_argument('--keep', metavar = 'DIR', help = 'generate the corpora in DIR and keep them')
+	args = parser.parse_args()
+
+	base = args.keep or tempfile.mkdtemp(prefix = 'schemr-bench-')
+	try:
+		for size in [int(size) for size in args.sizes.split(',')]:
+			root = os.path.join(base, str(size))
+			if not os.path.isdir(root):
+				generate_corpus(root, size)
+			benchmark(install_stubs(root, args.st2), size, args.repeat, [int(processes) for processes in args.processes.split(',') if processes])
+	finally:
+		if not args.keep:
+			shutil.rmtree(base)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,100 @@
+"""Profiling a large batch of schemes in a pool of worker processes.
+
+Parsing is CPU-bound, and threads only take turns holding the GIL, so a
+cold index (one in which few schemes are cached yet) of thousands of
+schemes uses a single core however many threads parse them. Worker
+processes each parse a shard of the schemes instead. Workers can't use the
+``sublime`` module, so they read the scheme files themselves through a
+``packages.ResourceLoader``, and send back only a compact ``(path, record,
+error)`` tuple per scheme: the profile encoded as a ``ProfileIndex``
+record, or the reason it couldn't be profiled and the error message.
+
+The pool relies on ``fork``, which both the plugin host and the worker
+functions survive without having to be imported again. Where it isn't
+available (e.g. on Windows) ``map_processes`` returns None and the caller
+falls back to parsing on threads.
+
+This module does not depend on the ``sublime`` module.
+"""
+
+import os
+
+try:
+	from . import packages
+	from . import scheme_cache
+	from . import scheme_formats
+	from . import scheme_profile
+except (ValueError, ImportError, SystemError):
+	import packages
+	import scheme_cache
+	import scheme_formats
+	import scheme_profile
+
+
+def profile_shard(shard):
+	"""Profile the schemes of one shard, a ``(roots, scheme_paths)`` tuple
+	where ``roots`` are the arguments of ``packages.ResourceLoader``.
+	Returns a ``(path, record, error)`` tuple for each scheme, where record
+	is the encoded profile as bytes, or None if error is a ``(reason,
+	message)`` tuple that tells why the scheme has none (see the failure
+	reasons in ``scheme_cache``).
+	"""
+	roots, scheme_paths = shard
+	results = []
+	with packages.ResourceLoader(*roots) as resources:
+		for scheme_path in scheme_paths:
+			try:
+				data = resources.open(scheme_path)
+			except (IOError, OSError) as e:
+				results.append((scheme_path, None, (scheme_cache.LOAD_FAILURE, str(e))))
+				continue
+
+			try:
+				profile = scheme_formats.load_profile(scheme_path, data)
+			except scheme_formats.SchemeParseError as e:
+				results.append((scheme_path, None, (scheme_cache.PARSE_FAILURE, str(e))))
+				continue
+			finally:
+				data.close()
+
+			if 'background' not in profile:
+				results.append((scheme_path, None, (scheme_cache.NO_BACKGROUND, 'missing or invalid')))
+			else:
+				results.append((scheme_path, bytes(bytearray(scheme_profile.encode_record(profile))), None))
+	return results
+
+
+def map_processes(roots, scheme_paths, processes, shard_size = 64):
+	"""Profile ``scheme_paths`` in a pool of ``processes`` worker processes,
+	in shards of ``shard_size`` schemes, and return the results of all
+	shards (see ``profile_shard``). Returns None if a process pool can't be
+	started here.
+	"""
+	if not hasattr(os, 'fork'):
+		return None
+	try:
+		import multiprocessing
+		if hasattr(multiprocessing, 'get_context'):
+			pool = multiprocessing.get_context('fork').Pool(processes)
+		else:
+			pool = multiprocessing.Pool(processes)
+	except (ImportError, OSError, ValueError) as e:
+		print('Schemr: unable to start worker processes (' + str(e) + ')')
+		return None
+
+	# Schemes from the same package end up in the same shard, so that each
+	# archive is only opened by a few workers.
+	scheme_paths = sorted(scheme_paths)
+	shards = [(roots, scheme_paths[start:start + shard_size]) for start in range(0, len(scheme_paths), shard_size)]
+
+	results = []
+	try:
+		for shard_results in pool.imap_unordered(profile_shard, shards):
+			results.extend(shard_results)
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+	return results
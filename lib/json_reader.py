@@ -0,0 +1,137 @@
+"""A lenient, incremental reader for Sublime Text's JSON resource files.
+
+Sublime Text allows comments and trailing commas in its JSON files, which
+the ``json`` module rejects. ``JsonReader`` accepts both, and lets the
+caller walk through an object one member at a time, or an array one item at
+a time, decoding only the values it asks for. A caller that has found what
+it is looking for can stop reading without going through the rest.
+
+This module does not depend on the ``sublime`` module.
+"""
+
+import re
+from json.decoder import JSONDecoder, scanstring
+
+try:
+	text_type = unicode
+except NameError:
+	text_type = str
+
+# Whitespace and comments between tokens.
+IGNORED = re.compile(r'(?:\s+|//[^\n]*|/\*.*?\*/)*', re.DOTALL)
+NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?')
+CONSTANTS = (('true', True), ('false', False), ('null', None))
+
+DECODER = JSONDecoder()
+
+
+class JsonReader(object):
+	"""Reads JSON from ``text``, a string or UTF-8 encoded bytes.
+
+	``members`` and ``items`` are generators that stop at each member or
+	item of the object or array at the current position. The caller may
+	read the value there with ``read``, walk into it with ``members`` or
+	``items``, or leave it, in which case it is skipped. ``ValueError`` is
+	raised for malformed JSON.
+	"""
+
+	def __init__(self, text):
+		if not isinstance(text, text_type):
+			text = bytes(text).decode('utf-8-sig')
+		self.text = text
+		self.pos = 0
+
+	def _peek(self):
+		self.pos = IGNORED.match(self.text, self.pos).end()
+		return self.text[self.pos:self.pos + 1]
+
+	def _expect(self, char):
+		if self._peek() != char:
+			self._error('Expecting ' + repr(char))
+		self.pos += 1
+
+	def _error(self, message):
+		raise ValueError('%s at position %d' % (message, self.pos))
+
+	def members(self):
+		"""Yield the name of each member of the object at the current position."""
+		self._expect('{')
+		while True:
+			char = self._peek()
+			if char == '}':
+				self.pos += 1
+				return
+			if char != '"':
+				self._error('Expecting property name')
+			name, self.pos = scanstring(self.text, self.pos + 1)
+			self._expect(':')
+
+			start = self.pos
+			yield name
+			if self.pos == start:
+				self.read()
+
+			char = self._peek()
+			if char == ',':
+				self.pos += 1
+			elif char != '}':
+				self._error('Expecting \',\' or \'}\'')
+
+	def items(self):
+		"""Yield the index of each item of the array at the current position."""
+		self._expect('[')
+		index = 0
+		while True:
+			char = self._peek()
+			if char == ']':
+				self.pos += 1
+				return
+
+			start = self.pos
+			yield index
+			if self.pos == start:
+				self.read()
+			index += 1
+
+			char = self._peek()
+			if char == ',':
+				self.pos += 1
+			elif char != ']':
+				self._error('Expecting \',\' or \']\'')
+
+	def read(self):
+		"""Decode and return the value at the current position."""
+		char = self._peek()
+		# Most values are strict JSON, which the json module decodes much
+		# faster. Only values with comments or trailing commas are decoded
+		# here.
+		try:
+			value, self.pos = DECODER.raw_decode(self.text, self.pos)
+			return value
+		except ValueError:
+			pass
+
+		if char == '{':
+			value = {}
+			for name in self.members():
+				value[name] = self.read()
+			return value
+		if char == '[':
+			return [self.read() for index in self.items()]
+		if char == '"':
+			value, self.pos = scanstring(self.text, self.pos + 1)
+			return value
+
+		match = NUMBER.match(self.text, self.pos)
+		if match:
+			self.pos = match.end()
+			if match.group(1) or match.group(2):
+				return float(match.group())
+			return int(match.group())
+
+		for name, value in CONSTANTS:
+			if self.text.startswith(name, self.pos):
+				self.pos += len(name)
+				return value
+
+		self._error('Expecting value')
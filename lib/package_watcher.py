@@ -0,0 +1,105 @@
+"""Notices packages being added, removed or changed by polling mtimes.
+
+``PackageWatcher`` takes a snapshot of the size and mtime of every archive
+in the installed packages folder, of every package folder in the packages
+folder, and of a set of watched directories inside them (e.g. the ones that
+contain loose schemes, whose mtime changes when a file is added, removed or
+replaced). Comparing two snapshots tells which packages have changed, so
+only those have to be scanned again. A snapshot only stats the entries at
+the top of both folders plus the watched directories, it never walks the
+packages.
+
+This module does not depend on the ``sublime`` module.
+"""
+
+import os
+import stat
+
+try:
+	from . import packages
+except (ValueError, ImportError, SystemError):
+	import packages
+
+ARCHIVE_EXTENSION = '.sublime-package'
+
+
+class PackageWatcher(object):
+	"""Watches ``packages_path`` and ``installed_packages_path`` for packages
+	that have been added, removed or changed since the previous ``poll``.
+	"""
+
+	def __init__(self, packages_path, installed_packages_path):
+		self.packages_path = packages_path
+		self.installed_packages_path = installed_packages_path
+		self.directories = ()
+		self.snapshot = None
+
+	def watch_directories(self, directories):
+		"""Also watch ``directories``, given relative to the packages folder
+		with ``/`` separators. Directories that are new to the watcher are
+		added to the current snapshot, so watching them doesn't report their
+		packages as changed.
+		"""
+		directories = tuple(sorted(set(directories)))
+		if directories == self.directories:
+			return
+		self.directories = directories
+
+		if self.snapshot is not None:
+			watched = set(('dir', directory) for directory in directories)
+			for key in [key for key in self.snapshot if key[0] == 'dir' and key not in watched]:
+				del self.snapshot[key]
+			for key in watched:
+				if key not in self.snapshot:
+					signature = stat_signature(os.path.join(self.packages_path, key[1]))
+					if signature is not None:
+						self.snapshot[key] = signature
+
+	def take_snapshot(self):
+		"""Return a dict of ``(kind, name)`` keys and ``(size, mtime)`` values,
+		where kind is "archive", "folder" or "dir".
+		"""
+		snapshot = {}
+		for name in packages.listdir(self.installed_packages_path):
+			if name.endswith(ARCHIVE_EXTENSION):
+				signature = stat_signature(os.path.join(self.installed_packages_path, name))
+				if signature is not None:
+					snapshot[('archive', name[:-len(ARCHIVE_EXTENSION)])] = signature
+		for name in packages.listdir(self.packages_path):
+			signature = stat_signature(os.path.join(self.packages_path, name), True)
+			if signature is not None:
+				snapshot[('folder', name)] = signature
+		for directory in self.directories:
+			signature = stat_signature(os.path.join(self.packages_path, directory), True)
+			if signature is not None:
+				snapshot[('dir', directory)] = signature
+		return snapshot
+
+	def poll(self):
+		"""Return the names of the packages that have been added, removed or
+		changed since the previous poll. The first poll only takes a snapshot
+		and returns an empty set.
+		"""
+		snapshot = self.take_snapshot()
+		previous, self.snapshot = self.snapshot, snapshot
+		if previous is None:
+			return set()
+
+		changed = set()
+		for key in set(previous) | set(snapshot):
+			if previous.get(key) != snapshot.get(key):
+				changed.add(key[1].split('/')[0])
+		return changed
+
+
+def stat_signature(path, directory = False):
+	"""The ``(size, mtime)`` of ``path``, or None if it doesn't exist (or
+	isn't a directory while ``directory`` is True).
+	"""
+	try:
+		st = os.stat(path)
+	except (IOError, OSError):
+		return None
+	if directory and not stat.S_ISDIR(st.st_mode):
+		return None
+	return (st.st_size, st.st_mtime)
@@ -0,0 +1,231 @@
+"""Finds resources in Sublime Text's package folders and ``.sublime-package``
+archives. Sublime Text 2 has no ``find_resources`` API, so Schemr has to
+look through the ``Packages`` and ``Installed Packages`` folders itself.
+
+This module does not depend on the ``sublime`` module.
+"""
+
+import io
+import os
+import threading
+import zipfile
+import zlib
+
+try:
+	from . import thread_pool
+except (ValueError, ImportError, SystemError):
+	import thread_pool
+
+
+class ArchiveIndex(object):
+	"""Remembers the members of each ``.sublime-package`` archive, keyed by
+	the archive's size and mtime, so that unchanged archives don't have to
+	be opened again to list their contents.
+	"""
+
+	def __init__(self):
+		self.entries = {}
+		self.lock = threading.Lock()
+
+	def members(self, archive_path, suffixes):
+		"""Return the names of the members of ``archive_path`` that end with
+		one of ``suffixes``.
+		"""
+		stat = os.stat(archive_path)
+		signature = (stat.st_size, stat.st_mtime, suffixes)
+
+		with self.lock:
+			entry = self.entries.get(archive_path)
+		if entry is not None and entry[0] == signature:
+			return entry[1]
+
+		try:
+			archive = zipfile.ZipFile(archive_path)
+		except zipfile.BadZipfile as e:
+			# Remember broken archives too, so they are only reported once.
+			print('Schemr: unable to read ' + archive_path + ' (' + str(e) + ')')
+			members = ()
+		else:
+			try:
+				members = tuple(name for name in archive.namelist() if name.endswith(suffixes))
+			finally:
+				archive.close()
+
+		with self.lock:
+			self.entries[archive_path] = (signature, members)
+		return members
+
+
+class ResourceLoader(object):
+	"""Opens resources by their ``Packages/...`` path, from a loose file in the
+	packages folder if there is one, or else from the package's archive in
+	the installed packages folder, or the default packages folder that ships
+	with Sublime Text 3 if ``default_packages_path`` is given. Archives are
+	opened once and kept open until ``close`` is called, so reading a batch
+	of resources from the same archive doesn't reopen it (and re-read its
+	central directory) each time.
+	"""
+
+	def __init__(self, packages_path, installed_packages_path, default_packages_path = None):
+		self.packages_path = packages_path
+		self.installed_packages_path = installed_packages_path
+		self.default_packages_path = default_packages_path
+		self.archives = {}
+		# ZipFile objects can't be read from several threads at once.
+		self.lock = threading.Lock()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def open(self, resource_path):
+		"""Return a binary file-like object for the resource. Archive members
+		are read straight into memory rather than extracted to disk.
+		"""
+		file_path, archive_path, member = self.locate(resource_path)
+		if file_path is not None:
+			return open(file_path, 'rb')
+
+		with self.lock:
+			archive = self.open_archive(archive_path)
+			try:
+				return io.BytesIO(archive.read(member))
+			except KeyError:
+				raise IOError('No such resource: ' + resource_path)
+
+	def checksum(self, resource_path):
+		"""Return the size and CRC-32 of the contents of the resource, which
+		are the same on every machine. For archive members both are read from
+		the archive's central directory, without decompressing the member.
+		"""
+		file_path, archive_path, member = self.locate(resource_path)
+		if file_path is not None:
+			with open(file_path, 'rb') as f:
+				data = f.read()
+			return (len(data), zlib.crc32(data) & 0xffffffff)
+
+		with self.lock:
+			archive = self.open_archive(archive_path)
+			try:
+				info = archive.getinfo(member)
+			except KeyError:
+				raise IOError('No such resource: ' + resource_path)
+			return (info.file_size, info.CRC)
+
+	def locate(self, resource_path):
+		# Returns the loose file that provides the resource, or else the archive and the
+		# name of the member that does.
+		relative_path = resource_path.replace('Packages/', '', 1)
+		file_path = os.path.join(self.packages_path, relative_path)
+		if os.path.isfile(file_path):
+			return (file_path, None, None)
+
+		package, member = relative_path.split('/', 1)
+		archive_path = os.path.join(self.installed_packages_path, package + '.sublime-package')
+		if self.default_packages_path is not None and not os.path.isfile(archive_path):
+			# An installed archive overrides the default archive of the same name entirely.
+			archive_path = os.path.join(self.default_packages_path, package + '.sublime-package')
+		return (None, archive_path, member)
+
+	def open_archive(self, archive_path):
+		# Must be called with the lock held.
+		archive = self.archives.get(archive_path)
+		if archive is None:
+			try:
+				archive = self.archives[archive_path] = zipfile.ZipFile(archive_path)
+			except zipfile.BadZipfile as e:
+				raise IOError('Unable to read ' + archive_path + ' (' + str(e) + ')')
+		return archive
+
+	def close(self):
+		with self.lock:
+			for archive in self.archives.values():
+				archive.close()
+			self.archives = {}
+
+
+def scan_packages(packages_path, installed_packages_path, suffixes, archive_index = None, workers = 4, default_packages_path = None):
+	"""Return the resource paths (e.g. ``Packages/Theme/Scheme.tmTheme``) of
+	all files ending with one of ``suffixes`` in the packages folder and in
+	the archives in the installed packages folder, plus the default packages
+	folder that ships with Sublime Text 3 if ``default_packages_path`` is
+	given. Each archive and package folder is scanned by a pool of
+	``workers`` threads.
+	"""
+	suffixes = tuple(suffixes)
+	if archive_index is None:
+		archive_index = ArchiveIndex()
+
+	jobs = []
+	installed = set()
+	for package in listdir(installed_packages_path):
+		if package.endswith('.sublime-package'):
+			installed.add(package)
+			jobs.append((scan_archive, (installed_packages_path, package[:-len('.sublime-package')], suffixes, archive_index)))
+	if default_packages_path is not None:
+		for package in listdir(default_packages_path):
+			# An installed archive overrides the default archive of the same name entirely.
+			if package.endswith('.sublime-package') and package not in installed:
+				jobs.append((scan_archive, (default_packages_path, package[:-len('.sublime-package')], suffixes, archive_index)))
+	for package in listdir(packages_path):
+		if os.path.isdir(os.path.join(packages_path, package)):
+			jobs.append((scan_folder, (packages_path, package, suffixes)))
+
+	# Loose files override archive members with the same path, so each
+	# resource is only listed once.
+	return unique(thread_pool.map_threaded(lambda job: job[0](*job[1]), jobs, workers))
+
+
+def scan_package(packages_path, installed_packages_path, package, suffixes, archive_index = None):
+	"""Return the resource paths of the files ending with one of ``suffixes``
+	in a single package, from its folder and its archive.
+	"""
+	suffixes = tuple(suffixes)
+	if archive_index is None:
+		archive_index = ArchiveIndex()
+
+	results = []
+	if os.path.isfile(os.path.join(installed_packages_path, package + '.sublime-package')):
+		results.append(scan_archive(installed_packages_path, package, suffixes, archive_index))
+	if os.path.isdir(os.path.join(packages_path, package)):
+		results.append(scan_folder(packages_path, package, suffixes))
+	return unique(results)
+
+
+def scan_archive(installed_packages_path, package, suffixes, archive_index):
+	archive_name = package + '.sublime-package'
+	try:
+		members = archive_index.members(os.path.join(installed_packages_path, archive_name), suffixes)
+	except (IOError, OSError) as e:
+		print('Schemr: unable to read ' + archive_name + ' (' + str(e) + ')')
+		return []
+	return ['Packages/' + package + '/' + member for member in members]
+
+
+def scan_folder(packages_path, package, suffixes):
+	resource_paths = []
+	for root, dirs, files in os.walk(os.path.join(packages_path, package)):
+		for filename in (filename for filename in files if filename.endswith(suffixes)):
+			relative_path = os.path.relpath(os.path.join(root, filename), packages_path)
+			resource_paths.append('Packages/' + relative_path.replace('\\', '/'))
+	return resource_paths
+
+
+def unique(path_lists):
+	resource_paths = []
+	seen = set()
+	for paths in path_lists:
+		for path in paths:
+			if path not in seen:
+				seen.add(path)
+				resource_paths.append(path)
+	return resource_paths
+
+
+def listdir(path):
+	try:
+		return os.listdir(path)
+	except OSError:
+		return []
@@ -20,12 +20,68 @@ if sys.version_info >= (3,):
 	# Some forwards compatability
 	basestring = str
 
+try:
+	memoryview
+except NameError:
+	# Python 2.6 has no memoryview, buffers are sliced directly instead.
+	memoryview = None
+
+
+# The engines that ``XmlPropertyListParser.parse`` can use:
+#
+# - 'stream' feeds the events of an incremental parse to the callbacks of
+#   ``XmlPropertyListParser``, or falls back to SAX if ``xml.etree`` is not
+#   available.
+# - 'tree' parses the whole document into an ``ElementTree`` first and then
+#   builds the values bottom-up with one handler per tag. It is faster, but
+#   holds the whole tree in memory while it works.
+# - 'plistlib' hands the document to the standard library (Python 3.4+).
+ENGINES = ('stream', 'tree', 'plistlib')
+
+_default_engine = 'stream'
+
 
 class PropertyListParseError(Exception):
 	"""Raised when parsing a property list is failed."""
 	pass
 
 
+class _BufferReader(object):
+	"""A read-only, file-like view of a buffer (``bytes``, ``bytearray``,
+	``memoryview`` or ``mmap``). The parser reads it one chunk at a time,
+	so the buffer is never copied as a whole.
+	"""
+
+	def __init__(self, buf):
+		self.view = memoryview(buf) if memoryview else buf
+		self.position = 0
+
+	def read(self, size=-1):
+		start = self.position
+		if size is None or size < 0:
+			end = len(self.view)
+		else:
+			end = min(start + size, len(self.view))
+		self.position = end
+
+		chunk = self.view[start:end]
+		if memoryview:
+			return chunk.tobytes()
+		return chunk
+
+	def close(self):
+		# Release the view, otherwise an mmap can't be closed while the
+		# reader is still referenced by the parser.
+		if hasattr(self.view, 'release'):
+			self.view.release()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+
 class XmlPropertyListParser(object):
 	"""The ``XmlPropertyListParser`` class provides methods that
 	convert `Property Lists`_ objects from xml format.
@@ -38,6 +94,10 @@ class XmlPropertyListParser(object):
 	.. _Property List: http://developer.apple.com/documentation/Cocoa/Conceptual/PropertyLists/
 	"""
 
+	def __init__(self, engine=None):
+		# ``None`` means the module's default engine, see ``set_default_engine``.
+		self.engine = engine
+
 	def _assert(self, test, message):
 		if not test:
 			raise PropertyListParseError(message)
@@ -94,12 +154,14 @@ class XmlPropertyListParser(object):
 		if name in XmlPropertyListParser.PARSE_CALLBACKS:
 			# Creates character string from buffered characters.
 			content = ''.join(self.__characters)
-			# For compatibility with ``xml.etree`` and ``plistlib``,
-			# convert text string to ascii, if possible
-			try:
-				content = content.encode('ascii')
-			except (UnicodeError, AttributeError):
-				pass
+			# For compatibility with ``xml.etree`` and ``plistlib`` on
+			# Python 2, convert text string to ascii, if possible. On
+			# Python 3 both return ``str``, so the text is left as is.
+			if XmlPropertyListParser.ENCODE_ASCII:
+				try:
+					content = content.encode('ascii')
+				except (UnicodeError, AttributeError):
+					pass
 			XmlPropertyListParser.PARSE_CALLBACKS[name](self, name, content)
 			self.__characters = None
 
@@ -183,25 +245,7 @@ class XmlPropertyListParser(object):
 	DATETIME_PATTERN = re.compile(r"(?P<year>\d\d\d\d)(?:-(?P<month>\d\d)(?:-(?P<day>\d\d)(?:T(?P<hour>\d\d)(?::(?P<minute>\d\d)(?::(?P<second>\d\d))?)?)?)?)?Z$")
 
 	def _parse_date(self, name, content):
-		import datetime
-
-		units = ('year', 'month', 'day', 'hour', 'minute', 'second', )
-		pattern = XmlPropertyListParser.DATETIME_PATTERN
-		match = pattern.match(content)
-		if not match:
-			raise PropertyListParseError("Failed to parse datetime '%s'" % content)
-
-		groups, components = match.groupdict(), []
-		for key in units:
-			value = groups[key]
-			if value is None:
-				break
-			components.append(int(value))
-		while len(components) < 3:
-			components.append(1)
-
-		d = datetime.datetime(*components)
-		self._push_value(d)
+		self._push_value(_parse_datetime(content))
 
 	def _parse_real(self, name, content):
 		self._push_value(float(content))
@@ -222,6 +266,9 @@ class XmlPropertyListParser(object):
 		'dict': _end_dict,
 	}
 
+	# See ``endElement``.
+	ENCODE_ASCII = sys.version_info < (3,)
+
 	PARSE_CALLBACKS = {
 		'key': _parse_key,
 		'string': _parse_string,
@@ -235,7 +282,11 @@ class XmlPropertyListParser(object):
 	# XmlPropertyListParser
 	# ------------------------------------------------
 	def _to_stream(self, io_or_string):
-		if isinstance(io_or_string, basestring):
+		if isinstance(io_or_string, (bytes, bytearray)) or (memoryview and isinstance(io_or_string, memoryview)):
+			# Reads encoded contents in chunks, letting the parser
+			# honour the encoding declared by the document.
+			return _BufferReader(io_or_string)
+		elif isinstance(io_or_string, basestring):
 			# Creates a string stream for in-memory contents.
 			from io import StringIO
 			return StringIO(io_or_string)
@@ -245,7 +296,7 @@ class XmlPropertyListParser(object):
 			raise TypeError('Can\'t convert %s to file-like-object' % type(io_or_string))
 
 	def _parse_using_etree(self, xml_input):
-		from xml.etree.cElementTree import iterparse
+		iterparse = _import_iterparse()
 
 		parser = iterparse(self._to_stream(xml_input), events=('start', 'end'))
 		self.startDocument()
@@ -268,9 +319,14 @@ class XmlPropertyListParser(object):
 		return self.__plist
 
 	def _parse_using_sax_parser(self, xml_input):
+		from io import TextIOBase
 		from xml.sax import make_parser, xmlreader, SAXParseException
 		source = xmlreader.InputSource()
-		source.setByteStream(self._to_stream(xml_input))
+		stream = self._to_stream(xml_input)
+		if isinstance(stream, TextIOBase):
+			source.setCharacterStream(stream)
+		else:
+			source.setByteStream(stream)
 		reader = make_parser()
 		reader.setContentHandler(self)
 		try:
@@ -280,6 +336,151 @@ class XmlPropertyListParser(object):
 
 		return self.__plist
 
+	def _parse_using_tree(self, xml_input):
+		try:
+			from xml.etree.cElementTree import parse as parse_tree
+		except ImportError:
+			from xml.etree.ElementTree import parse as parse_tree
+
+		try:
+			root = parse_tree(self._to_stream(xml_input)).getroot()
+		except SyntaxError as e:
+			raise PropertyListParseError(e)
+
+		# Like the callbacks, treat the <plist> element as optional.
+		if root.tag in _TREE_HANDLERS:
+			return _TREE_HANDLERS[root.tag](root)
+		if root.tag == 'plist':
+			self._assert(root.get('version', '1.0') == '1.0',
+						 "version 1.0 is only supported, but was '%s'." % root.get('version'))
+
+		values = [_TREE_HANDLERS[child.tag](child) for child in root if child.tag in _TREE_HANDLERS]
+		self._assert(values, "A top level element must be <plist>.")
+		self._assert(len(values) == 1, "multiple objects at top level.")
+		return values[0]
+
+	def _parse_using_plistlib(self, xml_input):
+		import plistlib
+
+		data = self._to_stream(xml_input).read()
+		if not isinstance(data, bytes):
+			data = data.encode('utf-8')
+		try:
+			return plistlib.loads(data, fmt=plistlib.FMT_XML)
+		except AttributeError:
+			raise ImportError("plistlib.loads requires Python 3.4 or later.")
+		except Exception as e:
+			raise PropertyListParseError(e)
+
+	def _iterate_using_etree(self, xml_input, key_path, items):
+		"""Yield the value at ``key_path``, or each of its items one at a
+		time if ``items`` is true, and stop reading as soon as the last one
+		has been read.
+		"""
+		iterparse = _import_iterparse()
+
+		key_path = tuple(key_path)
+		# Every open container on the way to ``key_path`` is tracked as
+		# [path, is_dict, pending key, next index]. Containers that are not
+		# on the way are only counted, since nothing inside them can match.
+		containers = []
+		skipped = 0
+		captured = 0
+		found = False
+
+		parser = iterparse(self._to_stream(xml_input), events=('start', 'end'))
+		try:
+			for action, element in parser:
+				name = element.tag
+				if captured:
+					# Build the matching value with the regular callbacks.
+					if action == 'start':
+						captured += 1
+						if name in XmlPropertyListParser.START_CALLBACKS:
+							XmlPropertyListParser.START_CALLBACKS[name](self, name, element.attrib)
+					else:
+						captured -= 1
+						if name in XmlPropertyListParser.END_CALLBACKS:
+							XmlPropertyListParser.END_CALLBACKS[name](self, name)
+						if name in XmlPropertyListParser.PARSE_CALLBACKS:
+							XmlPropertyListParser.PARSE_CALLBACKS[name](self, name, element.text or "")
+						element.clear()
+						if not captured:
+							self.endDocument()
+							yield self.__plist
+							if not items:
+								return
+				elif skipped:
+					if name == 'dict' or name == 'array':
+						skipped += 1 if action == 'start' else -1
+					if action == 'end':
+						element.clear()
+				elif action == 'start':
+					if name == 'plist' or name == 'key':
+						continue
+					if containers:
+						parent = containers[-1]
+						if parent[1]:
+							path = parent[0] + (parent[2],)
+							parent[2] = None
+						else:
+							path = parent[0] + (parent[3],)
+							parent[3] += 1
+					else:
+						path = ()
+
+					if items:
+						matches = len(path) == len(key_path) + 1 and path[:-1] == key_path
+					else:
+						matches = path == key_path
+
+					if matches:
+						captured = 1
+						self.startDocument()
+						if name in XmlPropertyListParser.START_CALLBACKS:
+							XmlPropertyListParser.START_CALLBACKS[name](self, name, element.attrib)
+					elif name == 'dict' or name == 'array':
+						if path == key_path[:len(path)]:
+							containers.append([path, name == 'dict', None, 0])
+							found = found or path == key_path
+						else:
+							skipped = 1
+				else:
+					if name == 'key':
+						self._assert(containers and containers[-1][1], "<key> element must be in <dict> element.")
+						containers[-1][2] = element.text or ""
+					elif name == 'dict' or name == 'array':
+						# The container that would have held the value (or
+						# the items) is closed, so there is no point reading
+						# any further.
+						containers.pop()
+						break
+					element.clear()
+		except SyntaxError as e:
+			raise PropertyListParseError(e)
+
+		if not found or not items:
+			raise KeyError(key_path)
+
+	def _query_using_etree(self, xml_input, key_path):
+		for value in self._iterate_using_etree(xml_input, key_path, False):
+			return value
+
+	def _query_using_sax_parser(self, xml_input, key_path):
+		value = self._parse_using_sax_parser(xml_input)
+		try:
+			for key in key_path:
+				value = value[key]
+		except (KeyError, IndexError, TypeError):
+			raise KeyError(tuple(key_path))
+		return value
+
+	def _iterate_using_sax_parser(self, xml_input, key_path):
+		value = self._query_using_sax_parser(xml_input, key_path)
+		if isinstance(value, dict):
+			return iter(value.values())
+		return iter(value)
+
 	def parse(self, xml_input):
 		"""Parse the property list (`.plist`, `.xml, for example) ``xml_input``,
 		which can be either a string or a file-like object.
@@ -290,21 +491,275 @@ class XmlPropertyListParser(object):
 		...              r'</plist>')
 		{'Python': '.py'}
 		"""
+		engine = self.engine or _default_engine
+		if engine == 'tree':
+			return self._parse_using_tree(xml_input)
+		elif engine == 'plistlib':
+			return self._parse_using_plistlib(xml_input)
+		elif engine != 'stream':
+			raise ValueError("Unknown engine '%s'" % engine)
+
 		try:
 			return self._parse_using_etree(xml_input)
 		except ImportError:
 			# No xml.etree.ccElementTree found.
 			return self._parse_using_sax_parser(xml_input)
 
+	def query(self, xml_input, key_path):
+		"""Return the value at ``key_path``, a sequence of dict keys and array
+		indexes, from the property list ``xml_input``. Parsing stops as soon
+		as the value has been read, or once it is certain that the value does
+		not exist, in which case ``KeyError`` is raised.
 
-def parse_string(io_or_string):
+		>>> parser = XmlPropertyListParser()
+		>>> parser.query(r'<plist version="1.0">'
+		...              r'<dict><key>Python</key><array><string>.py</string></array></dict>'
+		...              r'</plist>', ('Python', 0))
+		'.py'
+		"""
+		try:
+			return self._query_using_etree(xml_input, key_path)
+		except ImportError:
+			# No xml.etree found.
+			return self._query_using_sax_parser(xml_input, key_path)
+
+
+	def iterate(self, xml_input, key_path):
+		"""Return an iterator over the items of the array (or the values of
+		the dict) at ``key_path`` in the property list ``xml_input``. Each
+		item is parsed only when it is reached, so a caller that stops early
+		doesn't pay for parsing the rest of the document. ``KeyError`` is
+		raised if there is no container at ``key_path``.
+
+		>>> parser = XmlPropertyListParser()
+		>>> list(parser.iterate(r'<plist version="1.0">'
+		...                     r'<dict><key>Python</key><array><string>.py</string></array></dict>'
+		...                     r'</plist>', ('Python',)))
+		['.py']
+		"""
+		try:
+			_import_iterparse()
+		except ImportError:
+			# No xml.etree found.
+			return self._iterate_using_sax_parser(xml_input, key_path)
+		return self._iterate_using_etree(xml_input, key_path, True)
+
+
+def _parse_datetime(content):
+	import datetime
+
+	units = ('year', 'month', 'day', 'hour', 'minute', 'second', )
+	pattern = XmlPropertyListParser.DATETIME_PATTERN
+	match = pattern.match(content)
+	if not match:
+		raise PropertyListParseError("Failed to parse datetime '%s'" % content)
+
+	groups, components = match.groupdict(), []
+	for key in units:
+		value = groups[key]
+		if value is None:
+			break
+		components.append(int(value))
+	while len(components) < 3:
+		components.append(1)
+
+	return datetime.datetime(*components)
+
+
+# ------------------------------------------------
+# 'tree' engine handlers, one per value tag
+# ------------------------------------------------
+def _tree_dict(element):
+	value, key = {}, None
+	for child in element:
+		tag = child.tag
+		if tag == 'key':
+			key = child.text or ""
+		elif tag in _TREE_HANDLERS:
+			if key is None:
+				raise PropertyListParseError("Missing key for dictionary.")
+			value[key] = _TREE_HANDLERS[tag](child)
+			key = None
+	if key is not None:
+		raise PropertyListParseError("Missing value for key '%s'" % key)
+	return value
+
+
+def _tree_array(element):
+	value = []
+	for child in element:
+		tag = child.tag
+		if tag in _TREE_HANDLERS:
+			value.append(_TREE_HANDLERS[tag](child))
+		elif tag == 'key':
+			raise PropertyListParseError("<key> element must be in <dict> element.")
+	return value
+
+
+def _tree_data(element):
+	import base64
+	return base64.b64decode(element.text or "")
+
+
+_TREE_HANDLERS = {
+	'dict': _tree_dict,
+	'array': _tree_array,
+	'string': lambda element: element.text or "",
+	'true': lambda element: True,
+	'false': lambda element: False,
+	'integer': lambda element: int(element.text or ""),
+	'real': lambda element: float(element.text or ""),
+	'data': _tree_data,
+	'date': lambda element: _parse_datetime(element.text or ""),
+}
+
+
+def available_engines():
+	"""Return the names of the engines that can be used by this Python.
+	"""
+	engines = ['stream', 'tree']
+	try:
+		import plistlib
+		if hasattr(plistlib, 'loads'):
+			engines.append('plistlib')
+	except ImportError:
+		pass
+	return engines
+
+
+def set_default_engine(engine):
+	"""Select the engine used by parsers that weren't given one, see
+	``ENGINES``.
+	"""
+	global _default_engine
+	if engine not in ENGINES:
+		raise ValueError("Unknown engine '%s'" % engine)
+	_default_engine = engine
+
+
+def _import_iterparse():
+	try:
+		from xml.etree.cElementTree import iterparse
+	except ImportError:
+		# cElementTree was removed in Python 3.9, where ElementTree
+		# uses the C accelerator automatically.
+		from xml.etree.ElementTree import iterparse
+	return iterparse
+
+
+def parse_string(io_or_string, engine=None):
 	"""Parse a string (or a stream) and return the resulting object.
 	"""
-	return XmlPropertyListParser().parse(io_or_string)
+	return XmlPropertyListParser(engine).parse(io_or_string)
 
 
-def parse_file(file_path):
+def parse_bytes(buf, engine=None):
+	"""Parse an encoded buffer (``bytes``, ``bytearray``, ``memoryview`` or
+	``mmap``) and return the resulting object. The buffer is fed to the
+	parser incrementally and decoded by the parser itself, according to the
+	document's encoding declaration.
+	"""
+	with _BufferReader(buf) as reader:
+		return XmlPropertyListParser(engine).parse(reader)
+
+
+def parse_file(file_path, engine=None):
 	"""Parse the specified file and return the resulting object.
 	"""
-	with open(file_path) as f:
-		return XmlPropertyListParser().parse(f)
+	with open(file_path, 'rb') as f:
+		return XmlPropertyListParser(engine).parse(f)
+
+
+def query_string(io_or_string, key_path):
+	"""Return the value at ``key_path`` in a string (or a stream) without
+	parsing the rest of it.
+	"""
+	return XmlPropertyListParser().query(io_or_string, key_path)
+
+
+def query_bytes(buf, key_path):
+	"""Return the value at ``key_path`` in an encoded buffer (see
+	``parse_bytes``) without parsing the rest of it.
+	"""
+	with _BufferReader(buf) as reader:
+		return XmlPropertyListParser().query(reader, key_path)
+
+
+def query_file(file_path, key_path):
+	"""Return the value at ``key_path`` in the specified file without
+	parsing the rest of it.
+	"""
+	with open(file_path, 'rb') as f:
+		return XmlPropertyListParser().query(f, key_path)
+
+
+def iterate_string(io_or_string, key_path):
+	"""Iterate over the items at ``key_path`` in a string (or a stream),
+	parsing only as much of it as is read.
+	"""
+	return XmlPropertyListParser().iterate(io_or_string, key_path)
+
+
+def iterate_bytes(buf, key_path):
+	"""Iterate over the items at ``key_path`` in an encoded buffer (see
+	``parse_bytes``), parsing only as much of it as is read.
+	"""
+	with _BufferReader(buf) as reader:
+		for item in XmlPropertyListParser().iterate(reader, key_path):
+			yield item
+
+
+def compare_engines(file_paths):
+	"""Parse each of ``file_paths`` with every available engine, print the
+	files for which an engine's result differs from the 'stream' engine
+	and the time each engine took in total. Returns the number of files
+	with differences.
+	"""
+	import time
+
+	engines = available_engines()
+	timings = dict((engine, 0.0) for engine in engines)
+	mismatches = 0
+	for file_path in file_paths:
+		with open(file_path, 'rb') as f:
+			data = f.read()
+
+		results = {}
+		for engine in engines:
+			start = time.time()
+			try:
+				results[engine] = parse_bytes(data, engine)
+			except (PropertyListParseError, ValueError) as e:
+				results[engine] = PropertyListParseError(str(e))
+			timings[engine] += time.time() - start
+
+		for engine in engines:
+			expected, actual = results['stream'], results[engine]
+			if isinstance(expected, Exception):
+				same = isinstance(actual, Exception)
+			else:
+				same = actual == expected
+			if not same:
+				mismatches += 1
+				print('%s: %s engine differs from stream engine' % (file_path, engine))
+
+	for engine in engines:
+		print('%-8s %8.1f ms' % (engine, timings[engine] * 1000))
+	return mismatches
+
+
+if __name__ == '__main__':
+	# Usage: python plist_parser.py FILE_OR_FOLDER...
+	# Verifies that all engines agree on the given property lists.
+	import os
+
+	file_paths = []
+	for path in sys.argv[1:]:
+		if os.path.isdir(path):
+			for root, dirs, files in os.walk(path):
+				file_paths.extend(os.path.join(root, name) for name in files if name.endswith(('.tmTheme', '.plist')))
+		else:
+			file_paths.append(path)
+
+	print('Compared %d files' % len(file_paths))
+	sys.exit(1 if compare_engines(file_paths) else 0)
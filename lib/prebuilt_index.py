@@ -0,0 +1,115 @@
+"""Prebuilt scheme indexes, for machines that share the same packages.
+
+Run this module with plain Python (it doesn't need the ``sublime`` module)
+to find and profile the schemes in a packages folder and an installed
+packages folder, the same way Schemr does on Sublime Text 2, and write the
+result to an index file::
+
+	python lib/prebuilt_index.py PACKAGES INSTALLED_PACKAGES OUTPUT
+		[--default-packages DIR] [--build 3211] [--exclude PATTERN]
+		[--processes N]
+
+Put the index at ``Packages/User/Schemr.index.json`` on each machine (or
+point the ``schemr_prebuilt_index`` setting at it) and Schemr takes the
+profiles of the schemes it finds from there instead of parsing them.
+Entries carry the size and CRC-32 of the scheme's contents rather than
+mtimes, so an index stays valid on machines where the packages were
+installed at a different time. A scheme whose contents don't match its
+entry is parsed as usual.
+
+This module does not depend on the ``sublime`` module.
+"""
+
+import json
+
+try:
+	from . import cold_index
+	from . import packages
+	from . import scheme_cache
+	from . import scheme_formats
+	from . import scheme_names
+	from . import scheme_profile
+except (ValueError, ImportError, SystemError):
+	import cold_index
+	import packages
+	import scheme_cache
+	import scheme_formats
+	import scheme_names
+	import scheme_profile
+
+# Bump this whenever the layout of the index changes. Indexes written with a
+# different version are ignored.
+VERSION = 1
+
+
+def build(packages_path, installed_packages_path, default_packages_path = None, sublime_version = 3211, exclusions = (), processes = 0):
+	"""Return the index of the schemes in the given folders, as a dict that
+	can be dumped as JSON. ``sublime_version`` decides which scheme formats
+	are included, and ``exclusions`` are the ``schemr_exclude_patterns`` of
+	the machines the index is built for.
+	"""
+	names = scheme_names.SchemeNames(exclusions)
+	suffixes = scheme_formats.extensions(sublime_version)
+	scheme_paths = names.filter(packages.scan_packages(packages_path, installed_packages_path, suffixes, default_packages_path = default_packages_path))
+
+	roots = (packages_path, installed_packages_path, default_packages_path)
+	results = None
+	if processes > 1:
+		results = cold_index.map_processes(roots, scheme_paths, processes)
+	if results is None:
+		results = cold_index.profile_shard((roots, scheme_paths))
+
+	schemes = {}
+	failures = {}
+	with packages.ResourceLoader(*roots) as resources:
+		for scheme_path, record, error in results:
+			if error is not None:
+				failures[scheme_path] = list(error)
+				continue
+			profile = scheme_profile.decode_record(record)
+			schemes[scheme_path] = dict(name = names.name(scheme_path), checksum = list(resources.checksum(scheme_path)),
+				profile = dict((field, list(color)) for field, color in profile.items()))
+
+	return dict(version = VERSION, sublime_version = sublime_version, schemes = schemes, failures = failures)
+
+
+def write(index, path):
+	scheme_cache.write_json(path, index, sort_keys = True)
+
+
+def load(path):
+	"""Return the schemes of the index at ``path``, keyed by resource path,
+	or None if there is no index there or it has a different version.
+	"""
+	try:
+		with open(path, 'r') as f:
+			index = json.load(f)
+	except (IOError, OSError, ValueError):
+		return None
+
+	if not isinstance(index, dict) or index.get('version') != VERSION:
+		print('Schemr: ignoring prebuilt index ' + path + ' (expected version ' + str(VERSION) + ')')
+		return None
+	return index.get('schemes', {})
+
+
+def main(argv = None):
+	import argparse
+
+	parser = argparse.ArgumentParser(description = 'Prebuild the scheme index that Schemr loads at startup.')
+	parser.add_argument('packages', help = 'the Packages folder')
+	parser.add_argument('installed_packages', help = 'the Installed Packages folder')
+	parser.add_argument('output', help = 'where to write the index, e.g. Packages/User/Schemr.index.json')
+	parser.add_argument('--default-packages', help = 'the Packages folder next to the Sublime Text 3 executable')
+	parser.add_argument('--build', type = int, default = 3211, help = 'the Sublime Text build the index is for')
+	parser.add_argument('--exclude', action = 'append', default = [], metavar = 'PATTERN', help = 'a schemr_exclude_patterns entry (repeatable)')
+	parser.add_argument('--processes', type = int, default = 0, help = 'worker processes for parsing schemes')
+	args = parser.parse_args(argv)
+
+	index = build(args.packages, args.installed_packages, args.default_packages, args.build, args.exclude, args.processes)
+	write(index, args.output)
+	print('Schemr: indexed %d schemes (%d could not be parsed) to %s' % (len(index['schemes']), len(index['failures']), args.output))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,106 @@
+"""A persistent, on-disk cache of color scheme metadata.
+
+Parsing a color scheme just to read a few of its colors is expensive, so
+Schemr stores the results in a small JSON file and only re-parses a scheme
+when its signature (e.g. the mtime and size of the file or package archive
+that contains it) has changed since the last time it was parsed. Schemes
+that can't be profiled are cached too, with the reason they failed, so
+they aren't parsed (and reported) again until they change.
+
+This module does not depend on the ``sublime`` module.
+"""
+
+import json
+import os
+import threading
+
+# The reasons a scheme can't be profiled, as recorded in a failure entry.
+LOAD_FAILURE = 'load'
+PARSE_FAILURE = 'parse'
+NO_BACKGROUND = 'background'
+
+
+class SchemeCache(object):
+	"""Maps scheme resource paths to a signature and a dict of metadata.
+
+	Entries are only returned from ``get`` when the stored signature matches
+	the one given, so the caller decides what constitutes a change. An entry
+	has either a ``profile`` or a ``failure``, a dict of the ``reason`` (one
+	of the constants above) and the error ``message``.
+	"""
+
+	# Bump this whenever the layout of an entry changes. Cache files written
+	# with a different version are ignored and rebuilt from scratch.
+	VERSION = 3
+
+	def __init__(self, path):
+		self.path = path
+		self.entries = {}
+		self.dirty = False
+		# The cache is shared by the background indexer and the main thread.
+		self.lock = threading.Lock()
+
+	def load(self):
+		try:
+			with open(self.path, 'r') as f:
+				data = json.load(f)
+		except (IOError, OSError, ValueError):
+			# Missing or corrupt cache files are not an error, they just
+			# mean that every scheme has to be parsed again.
+			return
+
+		if isinstance(data, dict) and data.get('version') == SchemeCache.VERSION:
+			self.entries = data.get('schemes', {})
+
+	def save(self):
+		with self.lock:
+			if not self.dirty:
+				return
+
+			try:
+				write_json(self.path, dict(version = SchemeCache.VERSION, schemes = self.entries))
+			except (IOError, OSError) as e:
+				print('Schemr: unable to write scheme cache ' + self.path + ' (' + str(e) + ')')
+				return
+
+			self.dirty = False
+
+	def get(self, key, signature):
+		entry = self.entries.get(key)
+		if entry is not None and entry.get('signature') == list(signature):
+			return entry
+		return None
+
+	def set(self, key, signature, **values):
+		values['signature'] = list(signature)
+		with self.lock:
+			self.entries[key] = values
+			self.dirty = True
+
+	def discard(self, key):
+		with self.lock:
+			if self.entries.pop(key, None) is not None:
+				self.dirty = True
+
+
+def write_json(path, data, **options):
+	"""Write ``data`` to ``path`` as JSON (``options`` are passed on to
+	``json.dump``). The data is written to a temporary file first, which
+	then replaces ``path`` in one step, so neither an interrupted write nor
+	a concurrent reader ever finds a truncated or missing file. Raises
+	``IOError`` or ``OSError`` if the file can't be written.
+	"""
+	temp_path = path + '.tmp'
+	with open(temp_path, 'w') as f:
+		json.dump(data, f, **options)
+
+	if hasattr(os, 'replace'):
+		os.replace(temp_path, path)
+	elif os.name != 'nt':
+		# Renaming over an existing file is atomic on POSIX [ST2].
+		os.rename(temp_path, path)
+	else:
+		# Python 2 can't rename over an existing file on Windows [ST2].
+		if os.path.exists(path):
+			os.remove(path)
+		os.rename(temp_path, path)
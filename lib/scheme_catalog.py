@@ -0,0 +1,141 @@
+"""An immutable snapshot of the color schemes that Schemr manages.
+
+The catalog is built by a background indexer and then published in one
+step by replacing the previous catalog, so commands running on the main
+thread never see a half-built catalog.
+
+This module does not depend on the ``sublime`` module.
+"""
+
+import sys
+
+try:
+	_intern = sys.intern
+except AttributeError:
+	_intern = intern
+
+
+def intern_path(path):
+	"""Return the interned copy of ``path``, so that every list, index and
+	cache that refers to a scheme shares a single copy of its path.
+	"""
+	try:
+		return _intern(path)
+	except TypeError:
+		# Python 2 only interns byte strings.
+		return path
+
+
+class SchemeCatalog(object):
+	"""The available schemes as ``(name, path)`` tuples sorted by name, plus
+	a ``ProfileIndex`` of the colors of every scheme that could be parsed.
+
+	``by_path`` maps each path to its scheme and ``by_name`` maps each name to
+	a path. When two schemes share a name the first one in sorted order wins,
+	just as it would when searching through ``schemes``.
+	"""
+
+	def __init__(self, schemes, profiles):
+		self.schemes = tuple(schemes)
+		self.profiles = profiles
+
+		self.by_path = {}
+		self.by_name = {}
+		for scheme in self.schemes:
+			self.by_path[scheme[1]] = scheme
+			self.by_name.setdefault(scheme[0], scheme[1])
+
+	def __len__(self):
+		return len(self.schemes)
+
+
+class SchemeRecord(object):
+	"""A scheme as listed by the scheme commands: its name, its path and the
+	star that marks a favorite, which can also be read as ``record[0]`` to
+	``record[2]``. The record formats its quick panel item on first use and
+	keeps it, so every view that lists the scheme (all, favorites, dark,
+	light) shares the item instead of formatting its own.
+	"""
+
+	__slots__ = ('name', 'path', 'star', 'flag', 'item')
+
+	def __init__(self, name, path, star = ''):
+		self.name = name
+		self.path = path
+		self.star = star
+		self.flag = None
+		self.item = None
+
+	def __len__(self):
+		return 3
+
+	def __getitem__(self, index):
+		if index == 0:
+			return self.name
+		if index == 1:
+			return self.path
+		if index == 2:
+			return self.star
+		raise IndexError(index)
+
+	def panel_item(self, flag = ''):
+		"""Return the ``[label, path]`` quick panel item of the scheme, with
+		the brightness ``flag`` (e.g. ``'   [Dark]'``) after its name.
+		"""
+		if self.item is None or self.flag != flag:
+			self.item = [self.name + flag + self.star, self.path]
+			self.flag = flag
+		return self.item
+
+
+class SchemeList(object):
+	"""An immutable, ordered list of schemes (any sequences that start with a
+	name and a path) with hash indexes for finding a scheme's position by
+	name or path in constant time.
+	"""
+
+	def __init__(self, schemes):
+		self.schemes = tuple(schemes)
+		self._name_index = None
+		self._path_index = None
+
+	# The indexes are built on first use, since most views of the schemes
+	# are only ever searched by path.
+	@property
+	def name_index(self):
+		if self._name_index is None:
+			name_index = {}
+			for index, scheme in enumerate(self.schemes):
+				name_index.setdefault(scheme[0], index)
+			self._name_index = name_index
+		return self._name_index
+
+	@property
+	def path_index(self):
+		if self._path_index is None:
+			path_index = {}
+			for index, scheme in enumerate(self.schemes):
+				path_index.setdefault(scheme[1], index)
+			self._path_index = path_index
+		return self._path_index
+
+	def __len__(self):
+		return len(self.schemes)
+
+	def __getitem__(self, index):
+		return self.schemes[index]
+
+	def __iter__(self):
+		return iter(self.schemes)
+
+	def index_of(self, name, path = None):
+		"""Return the position of the scheme at ``path`` if it is listed, or
+		else of the first scheme called ``name``. Like ``list.index``, raises
+		``ValueError`` if there is no such scheme.
+		"""
+		if path in self.path_index:
+			return self.path_index[path]
+		try:
+			return self.name_index[name]
+		except KeyError:
+			raise ValueError(name)
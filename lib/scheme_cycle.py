@@ -0,0 +1,123 @@
+"""Cycling through scheme lists with a cursor and a shuffle bag per list.
+
+Each list (e.g. all schemes or the favorites) remembers the scheme it was
+last cycled to, so cycling continues from there when the active scheme
+isn't part of the list. Random cycling draws from a shuffle bag: a random
+permutation of the list that is handed out one scheme at a time, so every
+scheme is visited once before any of them repeats. A bag is stored as the
+seed of its permutation and the number of schemes drawn, which is enough
+to restore it after a restart.
+
+This module does not depend on the ``sublime`` module.
+"""
+
+import json
+import random
+
+try:
+	from . import scheme_cache
+except (ValueError, ImportError, SystemError):
+	import scheme_cache
+
+
+class ShuffleBag(object):
+	"""A random permutation of the positions of a list of ``size`` items,
+	drawn one position at a time. Once all of them have been drawn, the
+	next draw starts a new permutation.
+	"""
+
+	def __init__(self, size, seed = None, drawn = 0):
+		self.size = size
+		self.seed = seed if seed is not None else random.randrange(1 << 30)
+		self.drawn = drawn
+		self.order = None
+
+	def draw(self):
+		if self.drawn >= self.size:
+			last = self.order[-1] if self.order else None
+			self.seed = random.randrange(1 << 30)
+			self.drawn = 0
+			self.order = None
+			self.shuffle()
+			# Don't repeat the last position of the previous permutation.
+			if self.size > 1 and self.order[0] == last:
+				swap = random.randrange(1, self.size)
+				self.order[0], self.order[swap] = self.order[swap], self.order[0]
+
+		if self.order is None:
+			self.shuffle()
+		position = self.order[self.drawn]
+		self.drawn += 1
+		return position
+
+	def shuffle(self):
+		self.order = list(range(self.size))
+		random.Random(self.seed).shuffle(self.order)
+
+
+class CycleState(object):
+	"""The cursors and shuffle bags of the lists that have been cycled
+	through, keyed by list name and saved to a small JSON file at ``path``.
+	"""
+
+	# Bump this whenever the layout of the file changes.
+	VERSION = 1
+
+	def __init__(self, path):
+		self.path = path
+		self.cursors = {}
+		self.bags = {}
+		self.dirty = False
+
+	def load(self):
+		try:
+			with open(self.path, 'r') as f:
+				data = json.load(f)
+		except (IOError, OSError, ValueError):
+			return
+
+		if isinstance(data, dict) and data.get('version') == CycleState.VERSION:
+			self.cursors = data.get('cursors', {})
+			for name, bag in data.get('bags', {}).items():
+				self.bags[name] = ShuffleBag(bag['size'], bag['seed'], bag['drawn'])
+
+	def save(self):
+		if not self.dirty:
+			return
+
+		bags = dict((name, dict(size = bag.size, seed = bag.seed, drawn = bag.drawn)) for name, bag in self.bags.items())
+		try:
+			scheme_cache.write_json(self.path, dict(version = CycleState.VERSION, cursors = self.cursors, bags = bags))
+		except (IOError, OSError) as e:
+			print('Schemr: unable to write cycle state ' + self.path + ' (' + str(e) + ')')
+			return
+
+		self.dirty = False
+
+	def step(self, name, schemes, current, direction):
+		"""Return the position in ``schemes`` (a ``SchemeList``) to cycle to in
+		``direction`` ("next", "prev" or "rand") from ``current``, the position
+		of the active scheme, or None if it isn't in the list.
+		"""
+		size = len(schemes)
+
+		if current is None:
+			# Continue from the scheme this list was last cycled to, if it's still there.
+			current = schemes.path_index.get(self.cursors.get(name))
+
+		if direction == 'rand':
+			bag = self.bags.get(name)
+			if bag is None or bag.size != size:
+				# The list has changed, so the old permutation no longer applies.
+				bag = self.bags[name] = ShuffleBag(size)
+			index = bag.draw()
+			if index == current and size > 1:
+				index = bag.draw()
+		elif direction == 'prev':
+			index = current - 1 if current is not None and current > 0 else size - 1
+		else:
+			index = current + 1 if current is not None and current < size - 1 else 0
+
+		self.cursors[name] = schemes[index][1]
+		self.dirty = True
+		return index
@@ -0,0 +1,207 @@
+"""The color scheme formats that Schemr can list and profile.
+
+Each format is registered with its file extension, the first Sublime Text
+build that supports it, and a loader that turns the contents of a scheme
+file into a profile (see ``scheme_profile``). Schemes of every supported
+format are found in the same scan of the packages and parsed through the
+same code path, so supporting another format doesn't add another scan.
+
+This module does not depend on the ``sublime`` module.
+"""
+
+import colorsys
+import re
+
+try:
+	from . import json_reader
+	from . import plist_parser
+	from . import scheme_profile
+except (ValueError, ImportError, SystemError):
+	import json_reader
+	import plist_parser
+	import scheme_profile
+
+try:
+	string_types = basestring
+except NameError:
+	string_types = str
+
+
+class SchemeParseError(Exception):
+	"""Raised when a scheme file can't be parsed."""
+	pass
+
+
+class SchemeFormat(object):
+	def __init__(self, extension, loader, min_version):
+		self.extension = extension
+		self.loader = loader
+		self.min_version = min_version
+
+
+# The registered formats, in the order they were registered.
+FORMATS = []
+
+
+def register(extension, loader, min_version = 0):
+	"""Register ``loader`` for scheme files ending with ``extension`` on
+	Sublime Text builds from ``min_version`` onwards. ``loader`` is called
+	with the contents of a scheme file, as bytes or a binary file-like
+	object, and returns its profile or raises ``SchemeParseError``.
+	"""
+	FORMATS[:] = [scheme_format for scheme_format in FORMATS if scheme_format.extension != extension]
+	FORMATS.append(SchemeFormat(extension, loader, min_version))
+
+
+def extensions(version):
+	"""Return the extensions of the formats supported by build ``version``."""
+	return tuple(scheme_format.extension for scheme_format in FORMATS if version >= scheme_format.min_version)
+
+
+def load_profile(scheme_path, data):
+	"""Return the profile of the scheme at ``scheme_path``, given its contents."""
+	for scheme_format in FORMATS:
+		if scheme_path.endswith(scheme_format.extension):
+			return scheme_format.loader(data)
+	raise SchemeParseError('Unsupported scheme format: ' + scheme_path)
+
+
+# ------------------------------------------------
+# .tmTheme
+# ------------------------------------------------
+def load_tmtheme(data):
+	"""Read the profile from the ``settings`` array of a property list,
+	parsing no further than the last color that the profile needs.
+	"""
+	settings_path = ('settings',)
+	try:
+		if isinstance(data, bytes):
+			return scheme_profile.extract_profile(plist_parser.iterate_bytes(data, settings_path))
+		return scheme_profile.extract_profile(plist_parser.iterate_string(data, settings_path))
+	except plist_parser.PropertyListParseError as e:
+		raise SchemeParseError(str(e))
+	except KeyError:
+		# tmTheme is missing its settings
+		return {}
+
+
+# ------------------------------------------------
+# .sublime-color-scheme
+# ------------------------------------------------
+VARIABLE = re.compile(r'var\(\s*([\w-]+)\s*\)')
+COLOR_FUNCTION = re.compile(r'(rgb|hsl)a?\(([^)]*)\)')
+# Adjusters such as alpha() or blend() are ignored, only the base color is used.
+COLOR_MOD = re.compile(r'color\(\s*(var\([^)]*\)|(?:rgb|hsl)a?\([^)]*\)|[^\s)]+)')
+
+NAMED_COLORS = dict(
+	black = (0, 0, 0), silver = (192, 192, 192), gray = (128, 128, 128), grey = (128, 128, 128),
+	white = (255, 255, 255), maroon = (128, 0, 0), red = (255, 0, 0), purple = (128, 0, 128),
+	fuchsia = (255, 0, 255), magenta = (255, 0, 255), green = (0, 128, 0), lime = (0, 255, 0),
+	olive = (128, 128, 0), yellow = (255, 255, 0), navy = (0, 0, 128), blue = (0, 0, 255),
+	teal = (0, 128, 128), aqua = (0, 255, 255), cyan = (0, 255, 255), orange = (255, 165, 0))
+
+
+def resolve_color(value, variables, depth = 0):
+	"""Return the ``(r, g, b)`` components of a color in the syntax of
+	``.sublime-color-scheme`` files: a hex color, ``rgb()``, ``hsl()``, one
+	of the basic named colors or a ``var()`` that refers to one of those in
+	``variables``. Returns None if the color can't be resolved.
+	"""
+	# The depth guards against variables that refer to each other.
+	if not isinstance(value, string_types) or depth > 8:
+		return None
+	value = value.strip()
+
+	match = COLOR_MOD.match(value)
+	if match:
+		return resolve_color(match.group(1), variables, depth + 1)
+
+	match = VARIABLE.match(value)
+	if match:
+		return resolve_color(variables.get(match.group(1)), variables, depth + 1)
+
+	if value.startswith('#'):
+		return scheme_profile.parse_color(value)
+
+	match = COLOR_FUNCTION.match(value)
+	if match:
+		arguments = re.split(r'[\s,/]+', match.group(2).strip())
+		try:
+			if match.group(1) == 'rgb':
+				rgb = [float(n[:-1]) * 2.55 if n.endswith('%') else float(n) for n in arguments[:3]]
+			else:
+				hue = float(arguments[0].replace('deg', '')) / 360
+				saturation, lightness = [float(n.rstrip('%')) / 100 for n in arguments[1:3]]
+				rgb = [n * 255 for n in colorsys.hls_to_rgb(hue % 1, lightness, saturation)]
+		except (ValueError, IndexError):
+			return None
+		if len(rgb) < 3:
+			return None
+		return tuple(min(255, max(0, int(round(n)))) for n in rgb)
+
+	return NAMED_COLORS.get(value.lower())
+
+
+def load_color_scheme(data):
+	"""Read the profile from the ``globals`` and ``rules`` of a JSON color
+	scheme. Reading stops as soon as they, and the ``variables`` they refer
+	to, are known.
+	"""
+	if hasattr(data, 'read'):
+		data = data.read()
+
+	variables = None
+	global_colors = None
+	rule_colors = {}
+	rules_read = False
+	try:
+		reader = json_reader.JsonReader(data)
+		for name in reader.members():
+			if name == 'variables':
+				variables = reader.read()
+			elif name == 'globals':
+				global_colors = reader.read()
+			elif name == 'rules':
+				# Decoding the whole array at once is faster than walking it
+				# rule by rule, even though only the first few rules are used.
+				rules = reader.read()
+				missing = list(scheme_profile.SCOPE_FIELDS)
+				for rule in (rules if isinstance(rules, list) else ()):
+					if not missing:
+						break
+					if not isinstance(rule, dict) or not isinstance(rule.get('scope'), string_types) or 'foreground' not in rule:
+						continue
+					for field in [field for field in missing if scheme_profile.matches_scope(rule['scope'], field)]:
+						rule_colors[field] = rule['foreground']
+						missing.remove(field)
+				rules_read = True
+
+			if global_colors is not None and rules_read:
+				colors = list(rule_colors.values())
+				if isinstance(global_colors, dict):
+					colors.extend(global_colors.values())
+				if variables is not None or not [color for color in colors if isinstance(color, string_types) and 'var(' in color]:
+					break
+	except ValueError as e:
+		raise SchemeParseError(str(e))
+
+	if not isinstance(variables, dict):
+		variables = {}
+	if not isinstance(global_colors, dict):
+		global_colors = {}
+
+	profile = {}
+	for field in scheme_profile.GLOBAL_FIELDS:
+		color = resolve_color(global_colors.get(field), variables)
+		if color is not None:
+			profile[field] = color
+	for field, value in rule_colors.items():
+		color = resolve_color(value, variables)
+		if color is not None:
+			profile[field] = color
+	return profile
+
+
+register('.tmTheme', load_tmtheme)
+# Sublime Text 3 supports .sublime-color-scheme files from build 3150.
+register('.sublime-color-scheme', load_color_scheme, 3150)
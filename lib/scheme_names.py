@@ -0,0 +1,75 @@
+"""Turns scheme resource paths into display names and filters out the
+schemes that Schemr shouldn't manage, such as the variants of other
+schemes that some plugins generate.
+
+This module does not depend on the ``sublime`` module.
+"""
+
+import re
+
+# Strips the file extension and the suffixes added to generated variants,
+# e.g. "Monokai (SL).tmTheme" and "Monokai Color Highlighter.sublime-color-scheme".
+NAME_PATTERN = re.compile(r'(\ \(SL\))|(\ Color\ Highlighter)?.(tmTheme|sublime-color-scheme)', re.IGNORECASE)
+
+# Schemes generated by known plugins.
+DEFAULT_EXCLUSIONS = (r'SublimeLinter', r'Color\ Highlighter', r'Colorsublime - Themes\/cache')
+
+# Inline global flags, e.g. "(?i)", which are only allowed at the start of a pattern.
+GLOBAL_FLAGS_PATTERN = re.compile(r'\(\?[aiLmsux]+\)')
+
+
+class SchemeNames(object):
+	"""Remembers the display name of every path it has seen, so each name is
+	only computed once, and filters paths against the default exclusions
+	plus any user-defined ones, merged into a single compiled pattern where
+	that doesn't change what they match.
+	"""
+
+	def __init__(self, exclusions = ()):
+		self.names = {}
+		self.set_exclusions(exclusions)
+
+	def set_exclusions(self, exclusions):
+		"""Exclude paths matching any of the regular expressions in
+		``exclusions`` in addition to the default ones. Invalid expressions
+		are reported and ignored.
+
+		Expressions with groups (whose backreferences would be renumbered)
+		or inline global flags can't be merged with the others, so they are
+		matched on their own.
+		"""
+		patterns = list(DEFAULT_EXCLUSIONS)
+		self.separate_patterns = []
+		for pattern in exclusions:
+			try:
+				compiled = re.compile(pattern, re.IGNORECASE)
+			except (re.error, TypeError) as e:
+				print('Schemr: ignoring invalid exclusion pattern ' + repr(pattern) + ' (' + str(e) + ')')
+				continue
+
+			if compiled.groups or GLOBAL_FLAGS_PATTERN.search(pattern) or not self.merge(patterns + [pattern]):
+				self.separate_patterns.append(compiled)
+			else:
+				patterns.append(pattern)
+
+		self.exclusion_pattern = self.merge(patterns)
+
+	def merge(self, patterns):
+		# Returns the patterns compiled into one alternation, or None if they can't be.
+		try:
+			return re.compile('|'.join('(?:' + pattern + ')' for pattern in patterns), re.IGNORECASE)
+		except (re.error):
+			return None
+
+	def name(self, path):
+		name = self.names.get(path)
+		if name is None:
+			name = self.names[path] = NAME_PATTERN.sub('', path).split('/').pop()
+		return name
+
+	def filter(self, paths):
+		search = self.exclusion_pattern.search
+		paths = [path for path in paths if not search(path)]
+		for pattern in self.separate_patterns:
+			paths = [path for path in paths if not pattern.search(path)]
+		return paths
@@ -0,0 +1,243 @@
+"""Color profiles of color schemes, and a compact index of them.
+
+A profile records the colors that characterize a scheme: the background,
+foreground, caret and selection colors of its global settings and the
+foreground colors of a few common scopes. ``ProfileIndex`` stores the
+profiles of all schemes as fixed-width records in a single byte array, so
+that filtering and sorting thousands of schemes by brightness or contrast
+needs neither a dict per scheme nor the scheme files themselves.
+
+This module does not depend on the ``sublime`` module.
+"""
+
+from array import array
+
+# The colors of the global settings and the scopes recorded in a profile.
+# Their order defines the layout of a record in ProfileIndex.
+GLOBAL_FIELDS = ('background', 'foreground', 'caret', 'selection')
+SCOPE_FIELDS = ('comment', 'string', 'keyword')
+FIELDS = GLOBAL_FIELDS + SCOPE_FIELDS
+
+# Each color takes four bytes: a flag that is set if the scheme defines the
+# color, followed by its red, green and blue components.
+FIELD_SIZE = 4
+RECORD_SIZE = FIELD_SIZE * len(FIELDS)
+FIELD_OFFSETS = dict((field, index * FIELD_SIZE) for index, field in enumerate(FIELDS))
+
+
+def parse_color(value):
+	"""Return the ``(r, g, b)`` components of a ``#RGB``, ``#RRGGBB`` or
+	``#RRGGBBAA`` color, or None if ``value`` isn't a valid color.
+	"""
+	try:
+		value = value.lstrip('#')
+	except AttributeError:
+		return None
+
+	if len(value) == 3:
+		# Shorthand value, e.g. #111
+		# Repeat the values for correct base 16 conversion.
+		r, g, b = [value[i:i+1] * 2 for i in range(0, 3)]
+	else:
+		# Full-length color value, e.g. #111111 or #FFEEEEEE
+		# Here we assume the order of hex values is #RRGGBB
+		# or #RRGGBBAA and only use six characters.
+		r, g, b = [value[i:i+2] for i in range(0, 6, 2)]
+
+	try:
+		return tuple(int(n, 16) for n in (r, g, b))
+	except ValueError:
+		return None
+
+
+def matches_scope(selector, scope):
+	"""Return True if any of the comma-separated scope selectors in
+	``selector`` targets ``scope`` itself or one of its sub-scopes, e.g.
+	``comment.line`` or ``source.python comment`` for ``comment``.
+	"""
+	for part in selector.split(','):
+		names = part.split()
+		# Anything after a '-' is excluded rather than targeted.
+		if '-' in names:
+			names = names[:names.index('-')]
+		if names and (names[-1] == scope or names[-1].startswith(scope + '.')):
+			return True
+	return False
+
+
+def extract_profile(items):
+	"""Build a profile from the items of a scheme's ``settings`` array: the
+	global colors come from the first item and the scope colors from the
+	first rule that targets each scope. Returns a dict that maps the fields
+	the scheme defines to ``(r, g, b)`` tuples.
+
+	``items`` may be an iterator, which is only read until every field has
+	been found.
+	"""
+	profile = {}
+	missing = list(SCOPE_FIELDS)
+	for index, item in enumerate(items):
+		if not isinstance(item, dict) or not isinstance(item.get('settings'), dict):
+			continue
+		settings = item['settings']
+
+		if index == 0:
+			for field in GLOBAL_FIELDS:
+				color = parse_color(settings.get(field))
+				if color is not None:
+					profile[field] = color
+			continue
+
+		selector = item.get('scope')
+		color = parse_color(settings.get('foreground'))
+		if not selector or color is None:
+			continue
+		for field in [field for field in missing if matches_scope(selector, field)]:
+			profile[field] = color
+			missing.remove(field)
+		if not missing:
+			break
+
+	return profile
+
+
+def encode_record(profile):
+	"""Return the profile as a record for ``ProfileIndex``, an array of
+	``RECORD_SIZE`` bytes.
+	"""
+	record = array('B')
+	for field in FIELDS:
+		color = profile.get(field)
+		if color is None:
+			record.extend((0, 0, 0, 0))
+		else:
+			record.append(1)
+			record.extend(color)
+	return record
+
+
+def decode_record(record):
+	"""Return the profile encoded in ``record`` (see ``encode_record``)."""
+	record = bytearray(record)
+	profile = {}
+	for field in FIELDS:
+		offset = FIELD_OFFSETS[field]
+		if record[offset]:
+			profile[field] = tuple(record[offset + 1:offset + FIELD_SIZE])
+	return profile
+
+
+def luminance(rgb):
+	"""The perceived brightness of a color, from 0 (black) to 255 (white)."""
+	return (0.2126 * rgb[0]) + (0.7152 * rgb[1]) + (0.0722 * rgb[2])
+
+
+def relative_luminance(rgb):
+	"""The relative luminance of a color as defined by WCAG 2.0, from 0 to 1."""
+	channels = []
+	for value in rgb:
+		value = value / 255.0
+		channels.append(value / 12.92 if value <= 0.03928 else ((value + 0.055) / 1.055) ** 2.4)
+	return (0.2126 * channels[0]) + (0.7152 * channels[1]) + (0.0722 * channels[2])
+
+
+def contrast_ratio(first, second):
+	"""The WCAG 2.0 contrast ratio of two colors, from 1 to 21."""
+	lighter, darker = sorted((relative_luminance(first), relative_luminance(second)), reverse=True)
+	return (lighter + 0.05) / (darker + 0.05)
+
+
+class ProfileIndex(object):
+	"""Profiles of schemes, keyed by scheme path, stored one fixed-width
+	record after another in an ``array`` of bytes.
+	"""
+
+	def __init__(self):
+		self.records = array('B')
+		self.positions = {}
+
+	def __len__(self):
+		return len(self.positions)
+
+	def __contains__(self, key):
+		return key in self.positions
+
+	def add(self, key, profile):
+		"""Store the profile of ``key``, replacing its previous profile."""
+		self.add_record(key, encode_record(profile))
+
+	def add_record(self, key, record):
+		"""Store a profile of ``key`` that has already been encoded with
+		``encode_record``, as an array or as bytes.
+		"""
+		if not isinstance(record, array):
+			record = array('B', record)
+		if len(record) != RECORD_SIZE:
+			raise ValueError('Profile records are %d bytes long' % RECORD_SIZE)
+
+		position = self.positions.get(key)
+		if position is None:
+			self.positions[key] = len(self.records) // RECORD_SIZE
+			self.records.extend(record)
+		else:
+			offset = position * RECORD_SIZE
+			self.records[offset:offset + RECORD_SIZE] = record
+
+	def copy(self, other, key):
+		"""Store the profile of ``key`` from the ``ProfileIndex`` ``other``, if
+		it has one, without decoding it.
+		"""
+		position = other.positions.get(key)
+		if position is None:
+			return
+		offset = position * RECORD_SIZE
+		record = other.records[offset:offset + RECORD_SIZE]
+
+		position = self.positions.get(key)
+		if position is None:
+			self.positions[key] = len(self.records) // RECORD_SIZE
+			self.records.extend(record)
+		else:
+			offset = position * RECORD_SIZE
+			self.records[offset:offset + RECORD_SIZE] = record
+
+	def color(self, key, field):
+		"""Return the ``(r, g, b)`` color of ``field`` in the profile of
+		``key``, or None if it isn't known.
+		"""
+		position = self.positions.get(key)
+		if position is None:
+			return None
+		offset = position * RECORD_SIZE + FIELD_OFFSETS[field]
+		records = self.records
+		if not records[offset]:
+			return None
+		return (records[offset + 1], records[offset + 2], records[offset + 3])
+
+	def get(self, key):
+		"""Return the profile of ``key`` as a dict, or None if it isn't known."""
+		if key not in self.positions:
+			return None
+		profile = {}
+		for field in FIELDS:
+			color = self.color(key, field)
+			if color is not None:
+				profile[field] = color
+		return profile
+
+	def luminance(self, key):
+		"""The luminance of the background of ``key``, or None if it isn't known."""
+		background = self.color(key, 'background')
+		if background is None:
+			return None
+		return luminance(background)
+
+	def contrast(self, key):
+		"""The contrast ratio of the foreground and background of ``key``, or
+		None if either of them isn't known.
+		"""
+		background = self.color(key, 'background')
+		foreground = self.color(key, 'foreground')
+		if background is None or foreground is None:
+			return None
+		return contrast_ratio(foreground, background)
@@ -0,0 +1,113 @@
+"""An n-gram index for searching schemes by name, package and color.
+
+Each scheme is described by a short search text: its display name, the
+name of its package, its background color as a hex code and its
+brightness class ("dark" or "light"). ``SearchIndex`` maps every trigram of
+those texts, and every one- and two-character prefix of their words, to
+the positions of the schemes that contain it. A query is split into
+terms, and each term only has to be checked against the schemes listed
+under the rarest of its n-grams, so most queries look at a few dozen
+schemes rather than all of them.
+
+This module does not depend on the ``sublime`` module.
+"""
+
+import re
+from array import array
+
+try:
+	from . import scheme_profile
+except (ValueError, ImportError, SystemError):
+	import scheme_profile
+
+GRAM_SIZE = 3
+
+# Anything but letters, digits and the # of hex colors separates words.
+SEPARATORS = re.compile(r'[^\w#]+', re.UNICODE)
+
+
+class SearchIndex(object):
+	"""Indexes ``schemes`` (``(name, path)`` tuples, e.g. the schemes of a
+	``SchemeCatalog``) together with their background colors from
+	``profiles`` (a ``ProfileIndex``). Schemes whose background luminance
+	is below ``threshold`` are "dark", the others are "light". Searches
+	return positions in ``schemes``, so the index can be shared by any list
+	of records in the same order.
+	"""
+
+	def __init__(self, schemes, profiles, threshold):
+		self.texts = []
+		self.grams = {}
+		self.prefixes = {}
+
+		for position, scheme in enumerate(schemes):
+			text = search_text(scheme[0], scheme[1], profiles.color(scheme[1], 'background'), threshold)
+			# A leading space lets short terms match the start of the first word too.
+			self.texts.append(' ' + text)
+
+			for gram in set(text[start:start + GRAM_SIZE] for start in range(len(text) - GRAM_SIZE + 1)):
+				self.add(self.grams, gram, position)
+			for prefix in set(word[:length] for word in text.split() for length in range(1, GRAM_SIZE)):
+				self.add(self.prefixes, prefix, position)
+
+	def add(self, postings, key, position):
+		positions = postings.get(key)
+		if positions is None:
+			positions = postings[key] = array('i')
+		positions.append(position)
+
+	def candidates(self, term):
+		# Returns the positions of the schemes that could contain the term: those that
+		# contain its rarest trigram, or for short terms, a word that starts with it.
+		if len(term) < GRAM_SIZE:
+			return self.prefixes.get(term, ())
+		smallest = None
+		for start in range(len(term) - GRAM_SIZE + 1):
+			positions = self.grams.get(term[start:start + GRAM_SIZE])
+			if positions is None:
+				return ()
+			if smallest is None or len(positions) < len(smallest):
+				smallest = positions
+		return smallest
+
+	def search(self, query):
+		"""Return the positions of the schemes that match every term of
+		``query``, in the order they were indexed, except that schemes whose
+		name starts with the first term come first. Terms of three or more
+		characters match anywhere in the search text, shorter terms match
+		the start of a word.
+		"""
+		terms = SEPARATORS.sub(' ', query.lower()).split()
+		if not terms:
+			return list(range(len(self.texts)))
+
+		# Start from the term with the fewest candidates, and check the others
+		# against the search text of each candidate. The candidates of a term that is
+		# itself a trigram or a prefix all match it, so it isn't checked again.
+		candidate_lists = [(self.candidates(term), term) for term in terms]
+		candidate_lists.sort(key = lambda candidate_list: len(candidate_list[0]))
+		patterns = [term if len(term) >= GRAM_SIZE else ' ' + term for candidate_list, term in candidate_lists]
+		if len(candidate_lists[0][1]) <= GRAM_SIZE:
+			patterns.pop(0)
+
+		texts = self.texts
+		matches = candidate_lists[0][0]
+		for pattern in patterns:
+			matches = [position for position in matches if pattern in texts[position]]
+
+		first = ' ' + terms[0]
+		leading = [position for position in matches if texts[position].startswith(first)]
+		if len(leading) < len(matches):
+			matches = leading + [position for position in matches if not texts[position].startswith(first)]
+		return list(matches)
+
+
+def search_text(name, path, background, threshold):
+	"""Return the lower-case text a scheme is searched by: its name, its
+	package, and if the background is known, its hex code and brightness.
+	"""
+	parts = [name, path.split('/')[1]]
+	if background is not None:
+		parts.append('#%02x%02x%02x' % background)
+		parts.append('dark' if scheme_profile.luminance(background) < threshold else 'light')
+	return SEPARATORS.sub(' ', ' '.join(parts).lower()).strip()
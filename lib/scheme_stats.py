@@ -0,0 +1,138 @@
+"""Opt-in timers and counters for finding out where Schemr spends its time.
+
+``SchemeStats`` wraps methods of an object with timers that record each
+call's duration in a ``Histogram``, and keeps named counters (e.g. cache
+hits or bytes read). While it is disabled, no methods are wrapped and
+counting does nothing, so the instrumentation costs next to nothing.
+
+This module does not depend on the ``sublime`` module.
+"""
+
+import functools
+import threading
+import time
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+class Histogram(object):
+	"""Counts values in buckets with the upper bounds in ``BOUNDS`` (in
+	milliseconds), plus one bucket for everything above the last bound,
+	and keeps the count, total, minimum and maximum of all values.
+	"""
+
+	BOUNDS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+	def __init__(self):
+		self.buckets = [0] * (len(Histogram.BOUNDS) + 1)
+		self.count = 0
+		self.total = 0.0
+		self.minimum = None
+		self.maximum = None
+
+	def add(self, value):
+		index = 0
+		for bound in Histogram.BOUNDS:
+			if value <= bound:
+				break
+			index += 1
+		self.buckets[index] += 1
+		self.count += 1
+		self.total += value
+		if self.minimum is None or value < self.minimum:
+			self.minimum = value
+		if self.maximum is None or value > self.maximum:
+			self.maximum = value
+
+	def mean(self):
+		return self.total / self.count if self.count else 0.0
+
+	def to_dict(self):
+		labels = ['<=%g' % bound for bound in Histogram.BOUNDS] + ['>%g' % Histogram.BOUNDS[-1]]
+		return dict(count = self.count, total = self.total, mean = self.mean(), min = self.minimum, max = self.maximum,
+			buckets = dict((label, count) for label, count in zip(labels, self.buckets) if count))
+
+
+class SchemeStats(object):
+	"""Timers and counters, shared by the main thread and the indexer."""
+
+	def __init__(self):
+		self.enabled = False
+		self.timers = {}
+		self.counters = {}
+		self.lock = threading.Lock()
+		# The objects and method names that are currently wrapped.
+		self.wrapped = []
+
+	def enable(self, target, names):
+		"""Start timing the methods called ``names`` of ``target``."""
+		if self.enabled:
+			return
+		self.enabled = True
+		for name in names:
+			setattr(target, name, self.timed(name, getattr(target, name)))
+			self.wrapped.append((target, name))
+
+	def disable(self):
+		"""Stop timing and counting. The collected stats are kept."""
+		self.enabled = False
+		for target, name in self.wrapped:
+			delattr(target, name)
+		self.wrapped = []
+
+	def reset(self):
+		with self.lock:
+			self.timers = {}
+			self.counters = {}
+
+	def timed(self, name, function):
+		"""Return ``function`` wrapped with a timer called ``name``."""
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			start = timer()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				self.record(name, (timer() - start) * 1000)
+		return wrapper
+
+	def record(self, name, milliseconds):
+		with self.lock:
+			histogram = self.timers.get(name)
+			if histogram is None:
+				histogram = self.timers[name] = Histogram()
+			histogram.add(milliseconds)
+
+	def count(self, name, amount = 1):
+		if not self.enabled:
+			return
+		with self.lock:
+			self.counters[name] = self.counters.get(name, 0) + amount
+
+	def report(self):
+		"""Return the stats as a dict that can be dumped as JSON."""
+		with self.lock:
+			return dict(enabled = self.enabled, counters = dict(self.counters),
+				timers = dict((name, histogram.to_dict()) for name, histogram in self.timers.items()))
+
+	def format(self):
+		"""Return the stats as a plain text table."""
+		with self.lock:
+			lines = ['Schemr stats (profiling %s)' % ('enabled' if self.enabled else 'disabled, set schemr_profile to true'), '']
+			lines.append('%-20s %8s %12s %10s %10s %10s' % ('timer (ms)', 'count', 'total', 'mean', 'min', 'max'))
+			for name in sorted(self.timers):
+				histogram = self.timers[name]
+				lines.append('%-20s %8d %12.2f %10.3f %10.3f %10.3f' % (name, histogram.count, histogram.total,
+					histogram.mean(), histogram.minimum, histogram.maximum))
+				buckets = histogram.to_dict()['buckets']
+				lines.append('    ' + '  '.join('%s: %d' % (label, buckets[label]) for label in sorted(buckets, key = bucket_order)))
+
+			lines.extend(['', '%-20s %8s' % ('counter', 'value')])
+			for name in sorted(self.counters):
+				lines.append('%-20s %8d' % (name, self.counters[name]))
+			return '\n'.join(lines) + '\n'
+
+
+def bucket_order(label):
+	# Sorts '<=0.1' ... '<=1000' numerically, followed by '>1000'.
+	return (label.startswith('>'), float(label.lstrip('<=>')))
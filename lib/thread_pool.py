@@ -0,0 +1,43 @@
+"""A minimal thread pool for running blocking work (file I/O, parsing)
+off the main thread.
+
+``concurrent.futures`` isn't available in the Python 2.6 interpreter that
+ships with Sublime Text 2, so this module only relies on ``threading``.
+"""
+
+import threading
+
+
+def map_threaded(function, items, workers = 4):
+	"""Call ``function`` for each of ``items`` using up to ``workers`` threads
+	and return the results in the same order as ``items``. The first
+	exception raised by ``function`` is re-raised once all threads are done.
+	"""
+	items = list(items)
+	results = [None] * len(items)
+	errors = []
+	indexes = iter(range(len(items)))
+	lock = threading.Lock()
+
+	def work():
+		while not errors:
+			with lock:
+				try:
+					index = next(indexes)
+				except StopIteration:
+					return
+			try:
+				results[index] = function(items[index])
+			except Exception as e:
+				errors.append(e)
+
+	threads = [threading.Thread(target = work) for i in range(min(workers, len(items)))]
+	for thread in threads:
+		thread.daemon = True
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	if errors:
+		raise errors[0]
+	return results
@@ -1,14 +1,31 @@
 import sublime, sublime_plugin
-import sys, os, re, zipfile
-from random import random
+import sys, os, threading, time
+
+# Times how long loading the plugin takes, see plugin_loaded().
+timer = getattr(time, 'perf_counter', time.time)
+load_start = timer()
+load_timings = {}
 
 is_ST2 = int(sublime.version()) < 3000
 
+# Schemr's libraries are imported on first use with load_lib() rather than while the
+# plugin is loading, since most of them are only needed once a command has run.
 if not is_ST2:
-	import Schemr.lib.plist_parser as parser
+	lib_prefix = 'Schemr.lib.'
 else:
 	sys.path.append(os.path.join(os.path.dirname(__file__), 'lib'))
-	import plist_parser as parser
+	lib_prefix = ''
+
+	# Returns the library module with the given name, importing it if necessary.
+def load_lib(name):
+	module = sys.modules.get(lib_prefix + name)
+	if module is None:
+		module = __import__(lib_prefix + name, globals(), locals(), [name])
+	return module
+
+# The number of uncached schemes it takes for starting worker processes to pay off,
+# see schemr_index_processes.
+COLD_INDEX_MINIMUM = 256
 
 	# Contains various common, internal functions for Schemr.
 class Schemr(object):
@@ -23,46 +40,506 @@ class Schemr(object):
 	def __init__(self):
 		self.preferences = dict(filename = 'Preferences.sublime-settings', data = sublime.load_settings('Preferences.sublime-settings'))
 		self.favorites = dict(filename = 'SchemrFavorites.sublime-settings', data = sublime.load_settings('SchemrFavorites.sublime-settings'))
+		self.cache = load_lib('scheme_cache').SchemeCache(os.path.join(sublime.packages_path(), 'User', 'Schemr.cache'))
+		self.cache.load()
+		self.archive_index = None
+		self.scheme_extensions = load_lib('scheme_formats').extensions(int(sublime.version()))
+		self.names = load_lib('scheme_names').SchemeNames(self.preferences.get('data').get('schemr_exclude_patterns', []))
+
+		# The catalog is built and replaced by the background indexer. Until the first
+		# one is published, commands fall back to scanning for schemes synchronously,
+		# once, see get_catalog().
+		self.catalog = None
+		self.fallback_catalog = None
+		self.indexing = False
+		self.reindex = False
+		self.indexing_lock = threading.Lock()
+		# The packages the indexer has to scan again, or None if it has to rebuild the
+		# whole catalog.
+		self.index_packages = None
+
+		# Packages that are added, removed or changed behind Schemr's back are picked up
+		# by polling their mtimes every schemr_watch_interval ms, see watch_packages().
+		self.watcher = None
+		self.watching = False
+		self.watched_catalog = None
+		# Set once the plugin is unloaded, see stop().
+		self.stopped = False
+
+		# The catalog is only rebuilt when packages are added or removed or a setting that
+		# affects it changes. Package Control disables packages through ignored_packages
+		# while installing, upgrading or removing them, so watching it covers those events.
+		self.catalog_settings = self.get_catalog_settings()
+		self.preferences.get('data').add_on_change('schemr', self.on_preferences_change)
+
+		# The scheme lists handed to commands are derived from the catalog and the set of
+		# favorites, and are only rebuilt when either of them changes.
+		self.scheme_lists = None
+		self.favorite_set = None
+		self.favorites.get('data').add_on_change('schemr', self.on_favorites_change)
+
+		# The search index only depends on the catalog and the brightness threshold, so
+		# it outlives the scheme lists, see get_search_index().
+		self.search_index = None
+
+		# Incremented for every preview, so that superseded previews can tell they are stale.
+		self.preview_generation = 0
+
+		# Settings changes take effect in memory immediately, but the files are only written
+		# once no further changes have been made for schemr_save_delay ms. coalesced_saves
+		# counts the writes that were saved this way.
+		self.pending_saves = set()
+		self.save_generation = 0
+		self.coalesced_saves = 0
+
+		# The cursors and shuffle bags of the cycle commands, saved along with the settings.
+		self.cycle_state = load_lib('scheme_cycle').CycleState(os.path.join(sublime.packages_path(), 'User', 'Schemr.cycle'))
+		self.cycle_state.load()
+
+		# The prebuilt index (see prebuilt_index) that cold indexes take profiles from, as
+		# its file signature and schemes once it has been read.
+		self.prebuilt_path = self.get_prebuilt_path()
+		self.prebuilt = None
+
+		# Timers and counters for schemr_show_stats, only collected while schemr_profile is enabled.
+		self.stats = load_lib('scheme_stats').SchemeStats()
+		self.update_profiling()
+
+		# Returns a list of all managed schemes.  Each scheme is itself represented by a record
+		# (see scheme_catalog.SchemeRecord) that contains, in order, (1) its pretty-printed
+		# name, (2) its path and (3) whether or not it is favorited (a star, or an empty
+		# string). The list can be narrowed down to the "dark" or "light" schemes and sorted
+		# by "contrast", which is answered from the profile index of the catalog without
+		# reading any scheme files.
+	def load_schemes(self, brightness = None, sort = None):
+		scheme_lists = self.get_scheme_lists()
+		if brightness is None and sort is None:
+			return scheme_lists[1]
+
+		schemr_brightness_theshold = self.preferences.get('data').get('schemr_brightness_theshold', 100)
+		key = (brightness, sort, schemr_brightness_theshold)
+		views = scheme_lists[3]
+		if key not in views:
+			views[key] = self.filter_schemes(scheme_lists[0].profiles, scheme_lists[1], brightness, sort, schemr_brightness_theshold)
+		return views[key]
+
+		# Returns the schemes that match every term of the query, in the same format as
+		# load_schemes(). Terms are matched against the name and package of each scheme,
+		# and once it has been indexed, the hex code and brightness ("dark" or "light") of
+		# its background, e.g. "dark solarized" or "#1e1e".
+	def search_schemes(self, query):
+		scheme_lists = self.get_scheme_lists()
+		schemr_brightness_theshold = self.preferences.get('data').get('schemr_brightness_theshold', 100)
+		search_index = self.get_search_index(scheme_lists[0], schemr_brightness_theshold)
+
+		# The records of the scheme list are in the same order as the schemes of the catalog.
+		schemes = scheme_lists[1]
+		return load_lib('scheme_catalog').SchemeList([schemes[position] for position in search_index.search(query)])
+
+		# Returns the search index of the catalog (see scheme_search.SearchIndex), building
+		# it if the catalog or the threshold has changed since it was last built. Doesn't
+		# read any settings, so the indexer can build it ahead of the first search.
+	def get_search_index(self, catalog, threshold):
+		search_index = self.search_index
+		if search_index is None or search_index[0] is not catalog or search_index[1] != threshold:
+			search_index = (catalog, threshold, load_lib('scheme_search').SearchIndex(catalog.schemes, catalog.profiles, threshold))
+			self.search_index = search_index
+		return search_index[2]
+
+		# Returns the list of favorited schemes, in the same format as load_schemes().
+	def load_favorite_schemes(self):
+		return self.get_scheme_lists()[2]
+
+	def get_scheme_lists(self):
+		catalog = self.get_catalog()
+		scheme_lists = self.scheme_lists
+		if scheme_lists is None or scheme_lists[0] is not catalog:
+			# Given the name and path of all the color schemes, add in the information
+			# for whether or not it's been favorited. The records are shared by every
+			# view of the schemes (see load_schemes) rather than copied into each one.
+			favorites = self.get_favorite_set()
+			scheme_catalog = load_lib('scheme_catalog')
+			SchemeRecord = scheme_catalog.SchemeRecord
+			schemes = []
+			for scheme_name, scheme_path in catalog.schemes:
+				is_favorite = ''
+				if scheme_path in favorites: is_favorite = u'   \u2605' # Put a pretty star icon next to favorited schemes. :)
+				schemes.append(SchemeRecord(scheme_name, scheme_path, is_favorite))
+
+			favorite_schemes = [scheme for scheme in schemes if scheme.star]
+			scheme_lists = (catalog, scheme_catalog.SchemeList(schemes), scheme_catalog.SchemeList(favorite_schemes), {})
+			self.scheme_lists = scheme_lists
 
-		# Returns a list of all managed schemes.  Each scheme is itself represented by a list
-		# that contains, in order, (1) its pretty-printed name, (2) its path and (3) whether
-		# or not it is favorited (True or False).
-	def load_schemes(self):
+		return scheme_lists
+
+		# Returns the schemes whose background is darker ("dark") or at least as bright
+		# ("light") as the threshold, ordered from the highest to the lowest contrast
+		# between foreground and background if sort is "contrast". Schemes that haven't
+		# been profiled are left out of either brightness, and sorted last by contrast.
+	def filter_schemes(self, profiles, schemes, brightness, sort, threshold):
+		schemes = list(schemes)
+
+		if brightness is not None:
+			def has_brightness(scheme):
+				luminance = profiles.luminance(scheme[1])
+				return luminance is not None and (luminance < threshold) == (brightness == 'dark')
+			schemes = [scheme for scheme in schemes if has_brightness(scheme)]
+
+		if sort == 'contrast':
+			# The sort is stable, so schemes with the same contrast stay sorted by name.
+			schemes.sort(key=lambda scheme: -(profiles.contrast(scheme[1]) or 0))
+
+		return load_lib('scheme_catalog').SchemeList(schemes)
+
+		# Scans the packages for color schemes and returns the pretty-printed name and
+		# path of each one, sorted by name.
+	def find_schemes(self):
 		scheme_paths = []
-		favorites = self.get_favorites()
 
 		try: # use find_resources() first for ST3.
-			scheme_paths = sublime.find_resources('*.tmTheme')
-
-		except: # fallback to walk() for ST2
-			# Load the paths for schemes contained in zipped .sublime-package files.
-			for root, dirs, files in os.walk(sublime.installed_packages_path()):
-				for package in (package for package in files if package.endswith('.sublime-package')):
-					zf = zipfile.ZipFile(os.path.join(sublime.installed_packages_path(), package))
-					for filename in (filename for filename in zf.namelist() if filename.endswith('.tmTheme')):
-						filepath = os.path.join(root, package, filename).replace(sublime.installed_packages_path(), 'Packages').replace('.sublime-package', '').replace('\\', '/')
-						scheme_paths.append(filepath)
-
-			# Load the paths for schemes contained in folders.
-			for root, dirs, files in os.walk(sublime.packages_path()):
-				for filename in (filename for filename in files if filename.endswith('.tmTheme')):
-					filepath = os.path.join(root, filename).replace(sublime.packages_path(), 'Packages').replace('\\', '/')
-					scheme_paths.append(filepath)
-
-		scheme_paths = self.filter_scheme_list(scheme_paths)
-
-		# Given the paths of all the color schemes, add in the information for
-		# the pretty-printed name and whether or not it's been favorited.
-		schemes = []
-		for scheme_path in scheme_paths:
-			scheme_name = self.filter_scheme_name(scheme_path)
-			is_favorite = ''
-			if scheme_path in favorites: is_favorite = u'   \u2605' # Put a pretty star icon next to favorited schemes. :)
-			schemes.append([scheme_name, scheme_path, is_favorite])
+			for extension in self.scheme_extensions:
+				scheme_paths.extend(sublime.find_resources('*' + extension))
 
+		except: # fallback to scanning the package folders and archives for ST2
+			packages = load_lib('packages')
+			if self.archive_index is None:
+				self.archive_index = packages.ArchiveIndex()
+			scheme_paths = packages.scan_packages(sublime.packages_path(), sublime.installed_packages_path(), self.scheme_extensions, self.archive_index)
+
+		self.stats.count('files_scanned', len(scheme_paths))
+		intern_path = load_lib('scheme_catalog').intern_path
+		scheme_paths = [intern_path(scheme_path) for scheme_path in self.filter_scheme_list(scheme_paths)]
+
+		schemes = [(self.filter_scheme_name(scheme_path), scheme_path) for scheme_path in scheme_paths]
 		schemes.sort(key=lambda s: s[0].lower())
 		return schemes
 
+		# Returns the current catalog. Until the indexer has published the first one,
+		# a catalog without any profiles is built synchronously instead, and kept until
+		# then so that every command doesn't have to scan the packages again.
+	def get_catalog(self):
+		catalog = self.catalog
+		if catalog is None:
+			catalog = self.fallback_catalog
+			if catalog is None:
+				catalog = load_lib('scheme_catalog').SchemeCatalog(self.find_schemes(), load_lib('scheme_profile').ProfileIndex())
+				self.fallback_catalog = catalog
+		return catalog
+
+		# Starts the background indexer. The indexer scans for schemes, parses the ones
+		# that aren't cached yet in a small thread pool and then publishes the result as
+		# the new catalog. If the indexer is already running it will index again once
+		# it is done, so that changes made in the meantime aren't missed. If packages is
+		# given, only the schemes of those packages are scanned again and the rest of the
+		# catalog is kept (see update_catalog).
+	def refresh_catalog(self, packages = None):
+		if self.stopped:
+			return
+
+		# Settings are read here on the main thread rather than by the indexer.
+		brightness_flags = self.preferences.get('data').get('schemr_brightness_flags', True)
+		processes = self.preferences.get('data').get('schemr_index_processes', 0)
+		threshold = self.preferences.get('data').get('schemr_brightness_theshold', 100)
+
+		with self.indexing_lock:
+			self.index_brightness_flags = brightness_flags
+			self.index_processes = processes
+			self.index_threshold = threshold
+			if packages is None:
+				self.index_packages = None
+			elif self.index_packages is not None:
+				self.index_packages.update(packages)
+			if self.indexing:
+				self.reindex = True
+				return
+			self.indexing = True
+
+		thread = threading.Thread(target=self.index_schemes)
+		thread.daemon = True
+		thread.start()
+
+	def index_schemes(self):
+		while True:
+			with self.indexing_lock:
+				if self.stopped:
+					self.indexing = False
+					return
+				brightness_flags = self.index_brightness_flags
+				processes = self.index_processes
+				threshold = self.index_threshold
+				packages = self.index_packages
+				self.index_packages = set()
+				self.reindex = False
+
+			try:
+				if packages is None or self.catalog is None:
+					self.catalog = self.build_catalog(brightness_flags, processes, True)
+					self.fallback_catalog = None
+				elif packages:
+					self.catalog = self.update_catalog(self.catalog, packages, brightness_flags)
+			except:
+				# The catalog may only have been published without its profiles, or be
+				# missing changes, so the next refresh rebuilds it from scratch.
+				with self.indexing_lock:
+					self.indexing = False
+					self.index_packages = None
+				raise
+
+			with self.indexing_lock:
+				if self.stopped:
+					self.indexing = False
+					return
+				if not self.reindex:
+					self.indexing = False
+					break
+
+		# Build the search index ahead of the first search.
+		self.get_search_index(self.catalog, threshold)
+
+		# Returns a new catalog of all the schemes. If publish is True and no catalog has
+		# been published yet, the schemes are published without profiles as soon as they
+		# have been found, so commands don't have to wait for them to be parsed.
+	def build_catalog(self, brightness_flags, processes = 0, publish = False):
+		schemes = self.find_schemes()
+		if publish and self.catalog is None:
+			self.catalog = load_lib('scheme_catalog').SchemeCatalog(schemes, load_lib('scheme_profile').ProfileIndex())
+
+		profiles = load_lib('scheme_profile').ProfileIndex()
+		if brightness_flags:
+			self.profile_schemes([scheme_path for scheme_name, scheme_path in schemes], profiles, processes)
+
+		return load_lib('scheme_catalog').SchemeCatalog(schemes, profiles)
+
+		# Returns a copy of the catalog in which the schemes of the given packages have been
+		# scanned again. The schemes and profiles of every other package are carried over
+		# as they are, and only new or changed schemes of the given packages are parsed.
+	def update_catalog(self, catalog, packages, brightness_flags):
+		intern_path = load_lib('scheme_catalog').intern_path
+		scheme_paths = [intern_path(scheme_path) for scheme_path in self.filter_scheme_list(self.find_package_schemes(packages))]
+		scheme_path_set = set(scheme_paths)
+
+		kept = []
+		for scheme in catalog.schemes:
+			if scheme[1].split('/')[1] not in packages:
+				kept.append(scheme)
+			elif scheme[1] not in scheme_path_set:
+				# The scheme is gone, so there's no point in keeping it cached.
+				self.cache.discard(scheme[1])
+
+		schemes = kept + [(self.filter_scheme_name(scheme_path), scheme_path) for scheme_path in scheme_paths]
+		schemes.sort(key=lambda s: s[0].lower())
+
+		profiles = load_lib('scheme_profile').ProfileIndex()
+		if brightness_flags:
+			for scheme in kept:
+				profiles.copy(catalog.profiles, scheme[1])
+			self.profile_schemes(scheme_paths, profiles)
+
+		# Schemr's own files in Packages/User change that package too, so keep the current
+		# catalog (and the scheme lists derived from it) if nothing has actually changed.
+		if tuple(schemes) == catalog.schemes and all(profiles.get(scheme_path) == catalog.profiles.get(scheme_path) for scheme_path in scheme_paths):
+			return catalog
+
+		return load_lib('scheme_catalog').SchemeCatalog(schemes, profiles)
+
+		# Returns the paths of the schemes in the given packages. Like find_schemes(),
+		# it uses find_resources() for ST3 and only scans those packages for ST2.
+	def find_package_schemes(self, packages):
+		scheme_paths = []
+
+		try: # use find_resources() first for ST3.
+			for extension in self.scheme_extensions:
+				scheme_paths.extend(scheme_path for scheme_path in sublime.find_resources('*' + extension) if scheme_path.split('/')[1] in packages)
+
+		except: # fallback to scanning the package folders and archives for ST2
+			packages_module = load_lib('packages')
+			if self.archive_index is None:
+				self.archive_index = packages_module.ArchiveIndex()
+			scheme_paths = []
+			for package in sorted(packages):
+				scheme_paths.extend(packages_module.scan_package(sublime.packages_path(), sublime.installed_packages_path(), package, self.scheme_extensions, self.archive_index))
+
+		self.stats.count('files_scanned', len(scheme_paths))
+		return scheme_paths
+
+		# Adds the profiles of the given schemes to the profile index. Schemes that aren't
+		# cached are taken from the prebuilt index if it has them, and the rest are parsed
+		# in a small thread pool. If processes is more than 1 and enough of the schemes
+		# have to be parsed, they are parsed in a pool of worker processes instead.
+	def profile_schemes(self, scheme_paths, profiles, processes = 0):
+		uncached = []
+		for scheme_path in scheme_paths:
+			profile = self.get_cached_profile(scheme_path, self.scheme_signature(scheme_path))
+			if profile is None:
+				uncached.append(scheme_path)
+			elif profile is not False:
+				profiles.add(scheme_path, profile)
+		self.stats.count('cache_hits', len(scheme_paths) - len(uncached))
+
+		scheme_paths = uncached
+		if scheme_paths:
+			scheme_paths = self.profile_prebuilt_schemes(scheme_paths, profiles)
+		if processes > 1 and len(scheme_paths) >= COLD_INDEX_MINIMUM:
+			scheme_paths = self.profile_schemes_in_processes(scheme_paths, profiles, processes)
+
+		with self.open_resources() as resources:
+			for scheme_path, profile in zip(scheme_paths, load_lib('thread_pool').map_threaded(lambda scheme_path: self.get_profile(scheme_path, True, resources), scheme_paths)):
+				if profile is not False:
+					profiles.add(scheme_path, profile)
+		if not self.stopped:
+			self.cache.save()
+
+		# Adds the profiles of the given schemes from the prebuilt index (see prebuilt_index)
+		# to the profile index and the scheme cache, if the scheme's contents match those
+		# the index was built from. Returns the schemes that still have to be parsed.
+	def profile_prebuilt_schemes(self, scheme_paths, profiles):
+		prebuilt = self.load_prebuilt_index()
+		if not prebuilt:
+			return scheme_paths
+
+		remaining = []
+		with self.open_resources() as resources:
+			for scheme_path in scheme_paths:
+				entry = prebuilt.get(scheme_path)
+				try:
+					matches = entry is not None and list(resources.checksum(scheme_path)) == entry['checksum']
+				except (IOError, OSError):
+					matches = False
+				if not matches:
+					remaining.append(scheme_path)
+					continue
+
+				profile = dict((field, tuple(color)) for field, color in entry['profile'].items())
+				profiles.add(scheme_path, profile)
+				signature = self.scheme_signature(scheme_path)
+				if signature is not None:
+					self.cache.set(scheme_path, signature, name = entry['name'], profile = entry['profile'])
+
+		self.stats.count('prebuilt_hits', len(scheme_paths) - len(remaining))
+		return remaining
+
+		# Returns the schemes of the prebuilt index, which is only read again when the file
+		# has changed. Returns None if there is no prebuilt index.
+	def load_prebuilt_index(self):
+		path = self.prebuilt_path
+		try:
+			stat = os.stat(path)
+		except (OSError):
+			self.prebuilt = None
+			return None
+
+		signature = (path, int(stat.st_mtime), stat.st_size)
+		if self.prebuilt is None or self.prebuilt[0] != signature:
+			self.prebuilt = (signature, load_lib('prebuilt_index').load(path))
+		return self.prebuilt[1]
+
+	def get_prebuilt_path(self):
+		path = self.preferences.get('data').get('schemr_prebuilt_index', None)
+		if not path:
+			return os.path.join(sublime.packages_path(), 'User', 'Schemr.index.json')
+		return os.path.expanduser(path)
+
+		# Returns the folder with the packages that ship with Sublime Text 3, or None for ST2.
+	def get_default_packages_path(self):
+		if is_ST2:
+			return None
+		return os.path.join(os.path.dirname(sublime.executable_path()), 'Packages')
+
+		# Parses the given schemes in a pool of worker processes (see cold_index) and adds
+		# their profiles to the profile index and the scheme cache. Returns the schemes that
+		# still have to be parsed on threads: all of them if no pool could be started, or
+		# on ST3 the ones the workers couldn't load, which load_binary_resource() may find.
+	def profile_schemes_in_processes(self, scheme_paths, profiles, processes):
+		roots = (sublime.packages_path(), sublime.installed_packages_path(), self.get_default_packages_path())
+
+		results = load_lib('cold_index').map_processes(roots, scheme_paths, processes)
+		if results is None:
+			return scheme_paths
+
+		scheme_cache = load_lib('scheme_cache')
+		remaining = []
+		for scheme_path, record, error in results:
+			if error is not None and error[0] == scheme_cache.LOAD_FAILURE and not is_ST2:
+				remaining.append(scheme_path)
+			elif error is not None:
+				self.record_failure(scheme_path, error[0], error[1])
+			else:
+				profiles.add_record(scheme_path, record)
+				signature = self.scheme_signature(scheme_path)
+				if signature is not None:
+					self.cache.set(scheme_path, signature, name = self.filter_scheme_name(scheme_path), profile = dict((field, list(color)) for field, color in profiles.get(scheme_path).items()))
+
+		self.stats.count('process_parsed', len(results) - len(remaining))
+		return remaining
+
+		# Starts polling the package folders for changes, unless it's already running or
+		# schemr_watch_interval is 0. The polls run in the background on ST3.
+	def watch_packages(self):
+		if self.watching or self.get_watch_interval() <= 0:
+			return
+		if self.watcher is None:
+			self.watcher = load_lib('package_watcher').PackageWatcher(sublime.packages_path(), sublime.installed_packages_path())
+		self.watching = True
+		self.poll_packages()
+
+	def get_watch_interval(self):
+		return self.preferences.get('data').get('schemr_watch_interval', 5000)
+
+		# Compares the package folders with the previous poll and refreshes the catalog for
+		# the packages that have changed. The folders that contain loose schemes are watched
+		# as well, so that schemes added to or removed from a package folder are noticed.
+	def poll_packages(self):
+		interval = self.get_watch_interval()
+		if interval <= 0 or self.stopped:
+			self.watching = False
+			return
+
+		catalog = self.catalog
+		if catalog is not None and catalog is not self.watched_catalog:
+			self.watched_catalog = catalog
+			self.watcher.watch_directories(scheme[1][len('Packages/'):].rsplit('/', 1)[0] for scheme in catalog.schemes)
+
+		packages = self.watcher.poll()
+		if packages:
+			self.stats.count('packages_changed', len(packages))
+			self.refresh_catalog(packages)
+
+		(sublime.set_timeout if is_ST2 else sublime.set_timeout_async)(self.poll_packages, interval)
+
+	def get_catalog_settings(self):
+		preferences = self.preferences.get('data')
+		return [preferences.get('ignored_packages', []), preferences.get('schemr_brightness_flags', True), preferences.get('schemr_exclude_patterns', [])]
+
+		# Preferences also change every time a scheme is set, so only refresh the catalog
+		# when one of the settings that affect it has actually changed.
+	def on_preferences_change(self):
+		self.update_profiling()
+		self.prebuilt_path = self.get_prebuilt_path()
+
+		catalog_settings = self.get_catalog_settings()
+		if catalog_settings != self.catalog_settings:
+			if catalog_settings[2] != self.catalog_settings[2]:
+				self.names.set_exclusions(catalog_settings[2])
+			self.catalog_settings = catalog_settings
+			self.refresh_catalog()
+
+		if self.watcher is not None:
+			self.watch_packages()
+
+		# Wraps the methods that commands spend their time in with timers while schemr_profile
+		# is enabled, and removes them again once it is disabled.
+	def update_profiling(self):
+		if self.preferences.get('data').get('schemr_profile', False):
+			self.stats.enable(self, ('load_schemes', 'find_schemes', 'build_catalog', 'update_catalog', 'parse_scheme', 'list_schemes', 'search_schemes', 'cycle_schemes', 'find_scheme'))
+		elif self.stats.enabled:
+			self.stats.disable()
+
+		# Returns the collected stats as a dict, see scheme_stats.SchemeStats.report().
+	def get_stats(self):
+		report = self.stats.report()
+		report['counters']['coalesced_saves'] = self.coalesced_saves
+		return report
+
 		# Displayes the given schemes in a quick-panel, letting the user cycle through
 		# them to preview them and possibly select one.  The reason that this is a method
 		# here instead of a free-standing command is that the "List all schemes" and
@@ -70,10 +547,9 @@ class Schemr(object):
 		# underlying schemes that they operate on.  This method exists to provide that
 		# common listing functionality.
 	def list_schemes(self, window, schemes, preferences):
-		# Get the user-defined settings or return default values.
-		schemr_brightness_theshold = self.preferences.get('data').get('schemr_brightness_theshold', 100)
-		schemr_brightness_flags = self.preferences.get('data').get('schemr_brightness_flags', True)
-		schemr_preview_selection = self.preferences.get('data').get('schemr_preview_selection', True)
+		if not len(schemes):
+			sublime.status_message('Schemr: no schemes to list')
+			return
 
 		the_scheme_path = self.get_scheme(preferences)
 		the_scheme_name = self.filter_scheme_name(the_scheme_path)
@@ -81,135 +557,375 @@ class Schemr(object):
 		# If the active scheme isn't part of the scheme list, then we can't skip the
 		# selection to that point and the best we can do is start from the top of the list.
 		try:
-			the_index = [scheme[0] for scheme in schemes].index(the_scheme_name)
+			the_index = schemes.index_of(the_scheme_name, the_scheme_path)
 		except (ValueError):
 			the_index = 0
 
+		# The panel state is shared with the brightness resolver, which reopens the panel
+		# at the highlighted scheme once the missing brightness flags are known.
+		panel = dict(window = window, schemes = schemes, preferences = preferences, the_scheme_path = the_scheme_path, index = the_index, closed = False, replaced = False)
+		unresolved = self.show_schemes_panel(panel)
+
+		if unresolved:
+			thread = threading.Thread(target=self.resolve_brightness, args=(panel, unresolved))
+			thread.daemon = True
+			thread.start()
+
+		# Builds the display list of color schemes and shows it in a quick panel. The panel
+		# opens immediately, schemes that haven't been parsed yet are listed without a
+		# brightness flag. Returns the indexes of those schemes. Schemes that are known to
+		# be broken (see record_failure) are listed without a flag too, but aren't returned.
+	def show_schemes_panel(self, panel):
+		# Get the user-defined settings or return default values.
+		schemr_brightness_theshold = self.preferences.get('data').get('schemr_brightness_theshold', 100)
+		schemr_brightness_flags = self.preferences.get('data').get('schemr_brightness_flags', True)
+		schemr_preview_selection = self.preferences.get('data').get('schemr_preview_selection', True)
+
+		schemes = panel.get('schemes')
+		preferences = panel.get('preferences')
+		the_scheme_path = panel.get('the_scheme_path')
+		unresolved = []
+
 		# Build the display list of color schemes.
 		if schemr_brightness_flags:
 			color_schemes = list()
+			catalog = self.catalog
 
 			# Add a brightness flag to each scheme name if the luminance
 			# is above or below the schemr_brightness_threshold value.
-			for scheme in schemes:
-				# Get the RGB value of the scheme background and convert to luminance value.
-				rgb = self.parse_scheme(scheme[1])
+			for index, scheme in enumerate(schemes):
+				# Get the luminance of the scheme background from the catalog if the indexer has
+				# parsed it, otherwise from the cache. Schemes are never parsed here, so that
+				# opening the panel doesn't have to wait for them.
+				luminance = catalog.profiles.luminance(scheme[1]) if catalog is not None else None
+				if luminance is None:
+					profile = self.get_cached_profile(scheme[1], self.scheme_signature(scheme[1]))
+					if profile is None:
+						unresolved.append(index)
+					elif profile is not False:
+						luminance = load_lib('scheme_profile').luminance(profile['background'])
 				flag = ''
 
-				if rgb is not False:
-					luminance = (0.2126 * rgb[0]) + (0.7152 * rgb[1]) + (0.0722 * rgb[2])
+				if luminance is not None:
 					if luminance < schemr_brightness_theshold:
 						flag = '   [Dark]'
 					else:
 						flag = '   [Light]'
 
-				color_schemes.append([scheme[0] + flag + scheme[2], scheme[1]])
+				color_schemes.append(scheme.panel_item(flag))
+
+			# The panel is reopened once the missing flags are known, see resolve_brightness.
+			if unresolved:
+				sublime.status_message('Schemr: still indexing schemes, some brightness flags are not available yet')
 
 		else:
-			color_schemes = [[scheme[0] + scheme[2], scheme[1]] for scheme in schemes]
+			color_schemes = [scheme.panel_item() for scheme in schemes]
 
 		# Set a selection flag to detect when the panel is first opened in some
 		# versions of Sublime Text. This prevents the color scheme from 'flickering'
 		# from one scheme to another as the panel jumps to the active selection.
 		self.user_selected = False
 		def on_highlight(index):
+			if panel.get('replaced'):
+				return
+			panel['index'] = index
+			if schemr_preview_selection is not True:
+				return
 			if self.user_selected is True:
-				self.set_scheme(color_schemes[index][1], preferences)
+				self.preview_scheme(color_schemes[index][1], preferences)
 			else:
 				self.user_selected = True
 
+		# Once the panel has been replaced by a reopened one, Sublime Text cancels it,
+		# which must not restore the original scheme.
+		def on_select(index):
+			if panel.get('replaced'):
+				return
+			panel['closed'] = True
+			self.select_scheme(index, the_scheme_path, color_schemes, preferences)
+
 		try: # Attempt to enable preview-on-selection (only supported by Sublime Text 3).
-			if schemr_preview_selection is True:
-				window.show_quick_panel(color_schemes, lambda index: self.select_scheme(index, the_scheme_path, color_schemes, preferences), 0, the_index, on_highlight)
-			else:
-				window.show_quick_panel(color_schemes, lambda index: self.select_scheme(index, the_scheme_path, color_schemes, preferences), 0, the_index)
+			panel.get('window').show_quick_panel(color_schemes, on_select, 0, panel.get('index'), on_highlight)
 		except:
-			window.show_quick_panel(color_schemes, lambda index: self.select_scheme(index, the_scheme_path, color_schemes, preferences))
+			panel.get('window').show_quick_panel(color_schemes, on_select)
+
+		return unresolved
+
+		# Parses the schemes that were listed without a brightness flag in the background,
+		# starting with the highlighted scheme and working outwards from it, then reopens
+		# the panel with the new flags at the same position. The panel is left alone if
+		# none of the schemes could be profiled.
+	def resolve_brightness(self, panel, unresolved):
+		schemes = panel.get('schemes')
+		pending = set(unresolved)
+		center = None
+		resolved = 0
+
+		with self.open_resources() as resources:
+			while pending and not panel.get('closed'):
+				# Start again from the highlighted scheme whenever the highlight moves.
+				if panel.get('index') != center:
+					center = panel.get('index')
+					distance = 0
+
+				if center + distance in pending:
+					index = center + distance
+				elif center - distance in pending:
+					index = center - distance
+				else:
+					distance += 1
+					continue
+
+				pending.discard(index)
+				if self.get_profile(schemes[index][1], True, resources) is not False:
+					resolved += 1
+
+		# Persist the newly parsed schemes so the next listing doesn't parse them again.
+		if not self.stopped:
+			self.cache.save()
+		if resolved:
+			sublime.set_timeout(lambda: self.reopen_schemes_panel(panel), 0)
+
+	def reopen_schemes_panel(self, panel):
+		if panel.get('closed') or panel.get('replaced'):
+			return
+		panel['replaced'] = True
+		self.show_schemes_panel(dict(panel, replaced = False))
+
+		# Previews the highlighted scheme. Rapid highlight changes (e.g. holding down an
+		# arrow key) are coalesced: each one supersedes the pending preview, and only the
+		# last one is applied once the highlight has rested for schemr_preview_delay ms.
+	def preview_scheme(self, scheme_path, preferences):
+		schemr_preview_delay = self.preferences.get('data').get('schemr_preview_delay', 100)
+
+		self.preview_generation += 1
+		generation = self.preview_generation
+		def apply_preview():
+			if generation == self.preview_generation and self.get_scheme(preferences) != scheme_path:
+				self.set_scheme(scheme_path, preferences)
+
+		if schemr_preview_delay <= 0:
+			apply_preview()
+		elif hasattr(sublime, 'set_timeout_async'):
+			sublime.set_timeout_async(apply_preview, schemr_preview_delay)
+		else:
+			sublime.set_timeout(apply_preview, schemr_preview_delay)
+
+		# Discards any pending preview.
+	def cancel_preview(self):
+		self.preview_generation += 1
 
 	def select_scheme(self, index, the_scheme_path, color_schemes, preferences):
+		self.cancel_preview()
+
 		if index is -1:
 			# Restore or erase the original scheme setting.
 			if (the_scheme_path is not ''):
 				self.set_scheme(the_scheme_path, preferences)
-				sublime.save_settings(preferences.get('filename'))
+				self.save_settings(preferences.get('filename'))
 			else:
 				self.erase_scheme(preferences)
 		else:
 			# Persist the new scheme setting.
 			self.set_scheme(color_schemes[index][1], preferences)
-			sublime.save_settings(preferences.get('filename'))
+			self.save_settings(preferences.get('filename'))
 			sublime.status_message('Scheme: ' + color_schemes[index][0])
 
-		# Cycles the scheme in the given direction ("next", "prev" or "rand").
-	def cycle_schemes(self, schemes, direction):
-		the_scheme_name = self.filter_scheme_name(self.get_scheme(self.preferences))
-		num_of_schemes = len(schemes)
+		# Cycles the scheme in the given direction ("next", "prev" or "rand"). Each list of
+		# schemes keeps its own cursor and shuffle bag under list_name (see scheme_cycle),
+		# so random cycling visits every scheme in the list once before repeating any.
+	def cycle_schemes(self, schemes, direction, list_name = 'all'):
+		if not len(schemes):
+			sublime.status_message('Schemr: no schemes to cycle through')
+			return
+
+		the_scheme_path = self.get_scheme(self.preferences)
+		the_scheme_name = self.filter_scheme_name(the_scheme_path)
 
 		# Try to find the current scheme path in the available schemes otherwise
-		# start from the top of the list. Useful in case the user has manually
-		# saved an invalid scheme path or the current scheme file is not available.
+		# continue from the scheme this list was last cycled to, or from the top of
+		# the list. Useful in case the user has manually saved an invalid scheme path,
+		# the current scheme file is not available or it isn't part of this list.
 		try:
-			the_index = [scheme[0] for scheme in schemes].index(the_scheme_name)
+			the_index = schemes.index_of(the_scheme_name, the_scheme_path)
 		except (ValueError):
-			the_index = 0
-
-		if direction == 'next':
-			index = the_index + 1 if the_index < num_of_schemes - 1 else 0
-
-		if direction == 'prev':
-			index = the_index - 1 if the_index > 0 else num_of_schemes - 1
+			the_index = None
 
-		if direction == 'rand':
-			index = int(random() * len(schemes))
+		index = self.cycle_state.step(list_name, schemes, the_index, direction)
 
 		self.set_scheme(schemes[index][1], self.preferences)
-		sublime.save_settings(self.preferences.get('filename'))
+		self.save_settings(self.preferences.get('filename'))
 		sublime.status_message('Scheme: ' + schemes[index][0])
 
-		# Parse the scheme file for the background color and return the RGB values
-		# in order to determine if the scheme is Dark or Light. Use load_resources()
-		# first for ST3 or fallback to the absolute path for ST2.
-	def parse_scheme(self, scheme_path):
-		if not is_ST2:
-			try:
-				xml = sublime.load_resource(scheme_path)
-			except:
-				print('Error loading ' + scheme_path)
-				return False
-			try:
-				plist = parser.parse_string(xml)
-			except (parser.PropertyListParseError):
-				print('Error parsing ' + scheme_path)
-				return False
-		else:
-			xml = os.path.join(sublime.packages_path(), scheme_path.replace('Packages/', ''))
-			try:
-				plist = parser.parse_file(xml)
-			except (parser.PropertyListParseError):
-				print('Error parsing ' + scheme_path)
-				return False
+		# Parse the scheme file for the colors that make up its profile (see scheme_profile),
+		# in order to determine if the scheme is Dark or Light and how much contrast it has.
+		# The file is parsed by the loader registered for its format in scheme_formats.
+		# Use load_binary_resource() first for ST3 or fallback to a ResourceLoader for ST2,
+		# which can be shared by a batch of calls. Returns False if the scheme can't be
+		# parsed or doesn't have a valid background color.
+	def parse_scheme(self, scheme_path, resources = None):
+		scheme_formats = load_lib('scheme_formats')
+		scheme_cache = load_lib('scheme_cache')
 
 		try:
-			background_color = plist['settings'][0]['settings']['background'].lstrip('#')
-		except (KeyError): # tmTheme is missing a background color
+			if not is_ST2:
+				try:
+					data = sublime.load_binary_resource(scheme_path)
+				except (Exception) as e:
+					self.record_failure(scheme_path, scheme_cache.LOAD_FAILURE, str(e))
+					return False
+				self.stats.count('bytes_read', len(data))
+				profile = scheme_formats.load_profile(scheme_path, data)
+			else:
+				# ST2 schemes may be loose files or members of a .sublime-package archive.
+				if resources is None:
+					with self.open_resources() as resources:
+						return self.parse_scheme(scheme_path, resources)
+				try:
+					data = resources.open(scheme_path)
+				except (IOError, OSError) as e:
+					self.record_failure(scheme_path, scheme_cache.LOAD_FAILURE, str(e))
+					return False
+				with data:
+					profile = scheme_formats.load_profile(scheme_path, data)
+					# Parsing stops early, so count only what was actually read.
+					self.stats.count('bytes_read', data.tell())
+		except (scheme_formats.SchemeParseError) as e:
+			self.record_failure(scheme_path, scheme_cache.PARSE_FAILURE, str(e))
 			return False
 
-		if len(background_color) is 3:
-			# Shorthand value, e.g. #111
-			# Repeat the values for correct base 16 conversion.
-			r, g, b = [background_color[i:i+1] * 2 for i in range(0, 3)]
+		if 'background' not in profile: # scheme is missing a valid background color
+			self.record_failure(scheme_path, scheme_cache.NO_BACKGROUND, 'missing or invalid')
+			return False
+
+		return profile
+
+		# Records that the scheme can't be profiled in the scheme cache, so that it isn't
+		# parsed again (or reported again) until it changes. Schemes that can't be loaded or
+		# parsed are reported once, and are listed by the "Show broken schemes" command.
+	def record_failure(self, scheme_path, reason, message):
+		scheme_cache = load_lib('scheme_cache')
+		if reason == scheme_cache.LOAD_FAILURE:
+			print('Error loading ' + scheme_path + ' (' + message + ')')
+			self.stats.count('load_failures')
+		elif reason == scheme_cache.PARSE_FAILURE:
+			print('Error parsing ' + scheme_path + ' (' + message + ')')
+			self.stats.count('parse_failures')
 		else:
-			# Full-length color value, e.g. #111111 or #FFEEEEEE
-			# Here we assume the order of hex values is #RRGGBB
-			# or #RRGGBBAA and only use six characters.
-			r, g, b = [background_color[i:i+2] for i in range(0, 6, 2)]
+			self.stats.count('parse_failures')
 
-		try:
-			r, g, b = [int(n, 16) for n in (r, g, b)]
-		except (ValueError): # Error converting the hex value
+		signature = self.scheme_signature(scheme_path)
+		if signature is not None:
+			self.cache.set(scheme_path, signature, name = self.filter_scheme_name(scheme_path), failure = dict(reason = reason, message = message))
+
+		# Returns the schemes in the catalog that are known to be broken, as (name, path,
+		# failure) tuples where failure is the dict recorded by record_failure().
+	def get_broken_schemes(self):
+		broken = []
+		for scheme_name, scheme_path in self.get_catalog().schemes:
+			entry = self.cache.entries.get(scheme_path)
+			if entry is None or 'failure' not in entry:
+				continue
+			entry = self.cache.get(scheme_path, self.scheme_signature(scheme_path))
+			if entry is not None:
+				broken.append((scheme_name, scheme_path, entry['failure']))
+		return broken
+
+		# Return the profile of the scheme, using the scheme cache when the scheme hasn't
+		# changed since it was last parsed. Returns False if the scheme can't be parsed or
+		# doesn't have a valid background color, or if it isn't cached and parse is False.
+	def get_profile(self, scheme_path, parse = True, resources = None):
+		signature = self.scheme_signature(scheme_path)
+		profile = self.get_cached_profile(scheme_path, signature)
+		if profile is not None:
+			self.stats.count('cache_hits')
+			return profile
+		self.stats.count('cache_misses')
+
+		if not parse:
+			return False
+
+		profile = self.parse_scheme(scheme_path, resources)
+		if profile is False:
+			return False
+
+		if signature is not None:
+			self.cache.set(scheme_path, signature, name = self.filter_scheme_name(scheme_path), profile = dict((field, list(color)) for field, color in profile.items()))
+		return profile
+
+		# Return the cached profile of the scheme if it was cached with the given signature,
+		# False if it is known to be broken (see record_failure) or None if it isn't cached.
+	def get_cached_profile(self, scheme_path, signature):
+		if signature is None:
+			return None
+		entry = self.cache.get(scheme_path, signature)
+		if entry is None:
+			return None
+		if 'failure' in entry:
 			return False
+		return dict((field, tuple(color)) for field, color in entry['profile'].items())
+
+		# Return a signature for the file that provides the given scheme resource. A loose
+		# file in the Packages folder overrides a scheme in a .sublime-package archive, so
+		# it is checked first. If neither can be found (ST3 can load resources from places
+		# we don't know about) fall back to a checksum of the resource contents.
+	def scheme_signature(self, scheme_path):
+		relative_path = scheme_path.replace('Packages/', '', 1)
+		package = relative_path.split('/')[0]
+
+		candidates = [('file', os.path.join(sublime.packages_path(), relative_path))]
+		candidates.append(('archive', os.path.join(sublime.installed_packages_path(), package + '.sublime-package')))
+		if not is_ST2:
+			candidates.append(('archive', os.path.join(self.get_default_packages_path(), package + '.sublime-package')))
+
+		for kind, path in candidates:
+			try:
+				stat = os.stat(path)
+			except (OSError):
+				continue
+			return [kind, int(stat.st_mtime), stat.st_size]
 
-		return (r, g, b)
+		try:
+			import zlib
+			return ['checksum', zlib.crc32(sublime.load_binary_resource(scheme_path)) & 0xffffffff]
+		except:
+			return None
+
+		# Returns a loader for reading scheme files on ST2, where load_resource() isn't available,
+		# and for checking them against the prebuilt index.
+	def open_resources(self):
+		return load_lib('packages').ResourceLoader(sublime.packages_path(), sublime.installed_packages_path(), self.get_default_packages_path())
+
+		# Schedules the settings file to be written once changes have stopped coming in.
+	def save_settings(self, filename):
+		schemr_save_delay = self.preferences.get('data').get('schemr_save_delay', 1000)
+
+		if filename in self.pending_saves:
+			self.coalesced_saves += 1
+		self.pending_saves.add(filename)
+
+		self.save_generation += 1
+		generation = self.save_generation
+		if schemr_save_delay <= 0:
+			self.flush_settings()
+		else:
+			sublime.set_timeout(lambda: generation == self.save_generation and self.flush_settings(), schemr_save_delay)
+
+		# Stops watching the packages and indexing, and detaches from the settings, so that
+		# an instance left behind when the plugin is reloaded (e.g. when Package Control
+		# upgrades it) doesn't keep indexing or writing the same cache as the new one.
+	def stop(self):
+		self.stopped = True
+		self.preferences.get('data').clear_on_change('schemr')
+		self.favorites.get('data').clear_on_change('schemr')
+		self.flush_settings()
+
+		# Writes all settings files with pending changes, and the cycle state.
+	def flush_settings(self):
+		pending_saves, self.pending_saves = self.pending_saves, set()
+		for filename in pending_saves:
+			sublime.save_settings(filename)
+		self.cycle_state.save()
 
 	def set_scheme(self, scheme, preferences):
 		preferences.get('data').set('color_scheme', scheme)
@@ -222,47 +938,118 @@ class Schemr(object):
 
 	def set_favorites(self, schemes):
 		self.favorites.get('data').set('schemr_favorites', schemes)
-		sublime.save_settings(self.favorites.get('filename'))
+		self.save_settings(self.favorites.get('filename'))
+		self.on_favorites_change()
 
 	def get_favorites(self):
 		return self.favorites.get('data').get('schemr_favorites')
 
+		# Returns the favorites as a set for constant-time membership tests.
+	def get_favorite_set(self):
+		favorite_set = self.favorite_set
+		if favorite_set is None:
+			favorite_set = self.favorite_set = frozenset(self.get_favorites())
+		return favorite_set
+
+	def on_favorites_change(self):
+		self.favorite_set = None
+		self.scheme_lists = None
+
 	def filter_scheme_name(self, scheme_path):
-		regex = re.compile('(\ \(SL\))|(\ Color\ Highlighter)?.tmTheme', re.IGNORECASE)
-		scheme_name = re.sub(regex, '', scheme_path).split('/').pop()
-		return scheme_name
+		return self.names.name(scheme_path)
 
 	def filter_scheme_list(self, scheme_list):
-		# Filter schemes generated by known plugins.
-		regex = re.compile('SublimeLinter|Color\ Highlighter|Colorsublime - Themes\/cache', re.IGNORECASE)
-		return [scheme for scheme in scheme_list if not regex.search(scheme)]
+		# Filter schemes generated by known plugins and the user's exclusion patterns.
+		return self.names.filter(scheme_list)
 
+		# Returns the path of the listed scheme that scheme_path refers to: the scheme itself
+		# if it is listed, or else the first scheme with the same name (e.g. a scheme that
+		# has moved to another package). Returns False if there is none.
 	def find_scheme(self, scheme_path):
-		scheme_name = self.filter_scheme_name(scheme_path)
-		matching_paths = [path for name, path, favorited in self.load_schemes() if name == scheme_name]
-		if len(matching_paths) is not 0:
-			return matching_paths[0]
-		else:
-			return False
+		catalog = self.get_catalog()
+		if scheme_path in catalog.by_path:
+			return scheme_path
+		return catalog.by_name.get(self.filter_scheme_name(scheme_path), False)
 
-	# Called when Sublime API is ready [ST3].
+	# Called when Sublime API is ready [ST3]. Loading the plugin only registers its commands.
+	# Schemr itself (its settings, the scheme cache and the catalog) is set up a moment
+	# later, or on first use if a command runs before then.
 def plugin_loaded():
-	Schemr.instance()
+	start = timer()
+	sublime.set_timeout(warm_up, 1000)
+	load_timings['plugin_loaded'] = timer() - start
+
+	# Sets up Schemr and starts indexing the schemes in the background. Logs how long
+	# loading the plugin took if schemr_log_load_time is enabled.
+def warm_up():
+	schemr = Schemr.instance()
+	if schemr.preferences.get('data').get('schemr_log_load_time', False):
+		print('Schemr: plugin loaded in %.3f ms (import %.3f ms, plugin_loaded %.3f ms)' % (
+			(load_timings.get('import', 0) + load_timings.get('plugin_loaded', 0)) * 1000,
+			load_timings.get('import', 0) * 1000, load_timings.get('plugin_loaded', 0) * 1000))
+	schemr.refresh_catalog()
+	schemr.watch_packages()
+
+	# Updates the catalog when a scheme is saved in one of the package folders,
+	# e.g. while a scheme is being edited or a new one has been created. Only the
+	# package that contains the scheme is scanned again.
+class SchemrPackageListener(sublime_plugin.EventListener):
+	def on_post_save(self, view):
+		file_name = view.file_name()
+		if file_name and file_name.startswith(sublime.packages_path()) and file_name.endswith(Schemr.instance().scheme_extensions):
+			package = os.path.relpath(file_name, sublime.packages_path()).replace('\\', '/').split('/')[0]
+			Schemr.instance().refresh_catalog([package])
+
+	# Called when the plugin is unloaded or reloaded [ST3]. Stops Schemr and writes any
+	# settings changes that are still waiting to be saved. Sublime Text 3 doesn't reliably
+	# call it when it exits, so changes made within schemr_save_delay of quitting can be
+	# lost there.
+def plugin_unloaded():
+	if Schemr._instance:
+		Schemr._instance.stop()
+
+	# Sublime Text 2 calls unload_handler() instead [ST2].
+unload_handler = plugin_unloaded
+
+	# Writes any settings changes that are still waiting to be saved when Sublime Text
+	# exits [ST4]. Earlier versions never call on_exit().
+class SchemrExitListener(sublime_plugin.EventListener):
+	def on_exit(self):
+		plugin_unloaded()
 
 	# Display the full list of schemes available, regardless
 	# of whether or not they are favorited.
 class SchemrListSchemesCommand(sublime_plugin.WindowCommand):
-	def run(self):
-		Schemr.instance().list_schemes(self.window, Schemr.instance().load_schemes(), Schemr.instance().preferences)
+	def run(self, brightness = None, sort = None):
+		Schemr.instance().list_schemes(self.window, Schemr.instance().load_schemes(brightness, sort), Schemr.instance().preferences)
+
+	# Display the schemes that match a search query, e.g. "dark solarized" or "#1e1e".
+	# Asks for the query unless it is given as an argument.
+class SchemrSearchSchemesCommand(sublime_plugin.WindowCommand):
+	last_query = ''
+
+	def run(self, query = None):
+		if query is not None:
+			self.search(query)
+			return
+		self.window.show_input_panel('Search schemes:', SchemrSearchSchemesCommand.last_query, self.search, None, None)
+
+	def search(self, query):
+		SchemrSearchSchemesCommand.last_query = query
+		schemes = Schemr.instance().search_schemes(query)
+		if not len(schemes):
+			sublime.status_message('Schemr: no schemes match "' + query + '"')
+			return
+		Schemr.instance().list_schemes(self.window, schemes, Schemr.instance().preferences)
 
 	# Display the list of schemes that have been favorited.
 	# Only available if there are favorites to display.
 class SchemrListFavoriteSchemesCommand(sublime_plugin.WindowCommand):
 	def run(self):
-		Schemr.instance().list_schemes(self.window, [scheme for scheme in Schemr.instance().load_schemes() if scheme[2]], Schemr.instance().preferences)
+		Schemr.instance().list_schemes(self.window, Schemr.instance().load_favorite_schemes(), Schemr.instance().preferences)
 
 	def is_enabled(self):
-		return len(Schemr.instance().get_favorites()) > 0
+		return len(Schemr.instance().get_favorite_set()) > 0
 
 	# SchemrFavoriteCurrentSchemeCommand and SchemrUnfavoriteCurrentSchemeCommand
 	# work in conjunction. Only one is ever available to the user at a time,
@@ -276,7 +1063,7 @@ class SchemrFavoriteCurrentSchemeCommand(sublime_plugin.WindowCommand):
 			Schemr.instance().set_favorites(favorites)
 
 	def is_enabled(self):
-		return Schemr.instance().find_scheme(Schemr.instance().get_scheme(Schemr.instance().preferences)) not in Schemr.instance().get_favorites()
+		return Schemr.instance().find_scheme(Schemr.instance().get_scheme(Schemr.instance().preferences)) not in Schemr.instance().get_favorite_set()
 
 class SchemrUnfavoriteCurrentSchemeCommand(sublime_plugin.WindowCommand):
 	def run(self):
@@ -287,22 +1074,43 @@ class SchemrUnfavoriteCurrentSchemeCommand(sublime_plugin.WindowCommand):
 			Schemr.instance().set_favorites(favorites)
 
 	def is_enabled(self):
-		return Schemr.instance().find_scheme(Schemr.instance().get_scheme(Schemr.instance().preferences)) in Schemr.instance().get_favorites()
+		return Schemr.instance().find_scheme(Schemr.instance().get_scheme(Schemr.instance().preferences)) in Schemr.instance().get_favorite_set()
 
 	# Cycles the full list of schemes that are available
 	# regardless of whether or not they are favorited.
 class SchemrCycleSchemesCommand(sublime_plugin.WindowCommand):
-	def run(self, direction):
-		Schemr.instance().cycle_schemes(Schemr.instance().load_schemes(), direction)
+	def run(self, direction, brightness = None, sort = None):
+		list_name = ':'.join(['all'] + [arg for arg in (brightness, sort) if arg])
+		Schemr.instance().cycle_schemes(Schemr.instance().load_schemes(brightness, sort), direction, list_name)
+
+	# Lists the schemes that Schemr can't profile and the reason for each, e.g. files
+	# that can't be parsed or have no background color. They are skipped until they
+	# change. Selecting one opens it.
+class SchemrShowBrokenSchemesCommand(sublime_plugin.WindowCommand):
+	def run(self):
+		broken = Schemr.instance().get_broken_schemes()
+		if not broken:
+			sublime.status_message('Schemr: no broken schemes')
+			return
+
+		scheme_cache = load_lib('scheme_cache')
+		reasons = {scheme_cache.LOAD_FAILURE: 'Unable to load', scheme_cache.PARSE_FAILURE: 'Unable to parse', scheme_cache.NO_BACKGROUND: 'No background color'}
+		items = [[scheme_name, reasons.get(failure['reason'], failure['reason']) + ': ' + failure['message'], scheme_path] for scheme_name, scheme_path, failure in broken]
+
+		def on_select(index):
+			if index != -1:
+				self.window.run_command('open_file', {'file': '${packages}/' + broken[index][1].replace('Packages/', '', 1)})
+
+		self.window.show_quick_panel(items, on_select)
 
 	# Cycles the list of schemes that have been favorited. This command is
 	# only available if the number of favorites is enough to cycle through.
 class SchemrCycleFavoriteSchemesCommand(sublime_plugin.WindowCommand):
 	def run(self, direction):
-		Schemr.instance().cycle_schemes([scheme for scheme in Schemr.instance().load_schemes() if scheme[2]], direction)
+		Schemr.instance().cycle_schemes(Schemr.instance().load_favorite_schemes(), direction, 'favorites')
 
 	def is_enabled(self):
-		return len(Schemr.instance().get_favorites()) > 1
+		return len(Schemr.instance().get_favorite_set()) > 1
 
 class SchemrSetSyntaxSchemeCommand(sublime_plugin.TextCommand):
 	def run(self, edit):
@@ -318,7 +1126,7 @@ class SchemrResetSyntaxSchemeCommand(sublime_plugin.TextCommand):
 		syntax_file = os.path.splitext(os.path.basename(syntax_path))[0] + '.sublime-settings'
 
 		sublime.load_settings(syntax_file).erase('color_scheme')
-		sublime.save_settings(syntax_file)
+		Schemr.instance().save_settings(syntax_file)
 
 	def is_enabled(self):
 		syntax_path = self.view.settings().get('syntax')
@@ -326,6 +1134,32 @@ class SchemrResetSyntaxSchemeCommand(sublime_plugin.TextCommand):
 
 		return sublime.load_settings(syntax_file).has('color_scheme')
 
+	# Shows the stats collected while schemr_profile is enabled in an output panel, or
+	# writes them to Packages/User/Schemr.stats.json if output is "file".
+class SchemrShowStatsCommand(sublime_plugin.WindowCommand):
+	def run(self, output = 'panel'):
+		schemr = Schemr.instance()
+
+		if output == 'file':
+			import json
+			stats_path = os.path.join(sublime.packages_path(), 'User', 'Schemr.stats.json')
+			with open(stats_path, 'w') as f:
+				json.dump(schemr.get_stats(), f, indent = 4, sort_keys = True)
+			self.window.open_file(stats_path)
+			return
+
+		text = schemr.stats.format() + '%-20s %8d\n' % ('coalesced_saves', schemr.coalesced_saves)
+		if is_ST2:
+			panel = self.window.get_output_panel('schemr_stats')
+			edit = panel.begin_edit()
+			panel.erase(edit, sublime.Region(0, panel.size()))
+			panel.insert(edit, 0, text)
+			panel.end_edit(edit)
+		else:
+			panel = self.window.create_output_panel('schemr_stats')
+			panel.run_command('append', {'characters': text})
+		self.window.run_command('show_panel', {'panel': 'output.schemr_stats'})
+
 	# These commands are provided for backwards-compatibility.
 	# SchemrCycleSchemeCommand should be used instead.
 class SchemrNextSchemeCommand(sublime_plugin.WindowCommand):
@@ -338,4 +1172,6 @@ class SchemrRandomSchemeCommand(sublime_plugin.WindowCommand):
 	def run(self):
 		self.window.run_command('schemr_cycle_schemes', {'direction': 'rand'})
 
+load_timings['import'] = timer() - load_start
+
 if is_ST2: plugin_loaded()